@@ -256,14 +256,19 @@ def log_host_progress_cb(pool: Parallel, task_result: TaskResult):
 # =====
 def gen(args: cli_args.ShowGenOptions, loader: ann_gen.Loader):
     """ Сгенерировать конфиг для устройств """
+    pool = gen_pool(args, loader)
+    return pool.run(loader.device_ids, args.tolerate_fails, args.strict_exit_code)
+
+
+def gen_pool(args: cli_args.ShowGenOptions, loader: ann_gen.Loader) -> Parallel:
+    """ Пул генерации конфига, результаты по устройствам можно получать по мере готовности через irun() """
     stdin = args.stdin(filter_acl=args.filter_acl, config=None)
 
     filterer = filtering.filterer_connector.get()
     pool = Parallel(ann_gen.worker, args, stdin, loader, filterer).tune_args(args)
     if args.show_hosts_progress:
         pool.add_callback(PoolProgressLogger(loader.device_fqdns))
-
-    return pool.run(loader.device_ids, args.tolerate_fails, args.strict_exit_code)
+    return pool
 
 
 # =====
@@ -271,6 +276,12 @@ def gen(args: cli_args.ShowGenOptions, loader: ann_gen.Loader):
 
 def patch(args: cli_args.ShowPatchOptions, loader: ann_gen.Loader):
     """ Сгенерировать патч для устройств """
+    pool = patch_pool(args, loader)
+    return pool.run(loader.device_ids, args.tolerate_fails, args.strict_exit_code)
+
+
+def patch_pool(args: cli_args.ShowPatchOptions, loader: ann_gen.Loader) -> Parallel:
+    """ Пул генерации патча, результаты по устройствам можно получать по мере готовности через irun() """
     if args.config == "running":
         fetcher = annet.deploy.get_fetcher()
         ann_gen.live_configs = annet.lib.do_async(fetcher.fetch(loader.devices, processes=args.parallel))
@@ -280,7 +291,7 @@ def patch(args: cli_args.ShowPatchOptions, loader: ann_gen.Loader):
     pool = Parallel(_patch_worker, args, stdin, loader, filterer).tune_args(args)
     if args.show_hosts_progress:
         pool.add_callback(PoolProgressLogger(loader.device_fqdns))
-    return pool.run(loader.device_ids, args.tolerate_fails, args.strict_exit_code)
+    return pool
 
 
 def _patch_worker(device_id, args: cli_args.ShowPatchOptions, stdin, loader: ann_gen.Loader, filterer: filtering.Filterer):
@@ -345,6 +356,12 @@ def diff(
     device_ids: List[Any]
 ) -> tuple[Mapping[Device, Union[Diff, PCDiff]], Mapping[Device, Exception]]:
     """ Сгенерировать дифф для устройств """
+    pool = diff_pool(args, loader, device_ids)
+    return pool.run(device_ids, args.tolerate_fails, args.strict_exit_code)
+
+
+def diff_pool(args: cli_args.DiffOptions, loader: ann_gen.Loader, device_ids: List[Any]) -> Parallel:
+    """ Пул генерации диффа, результаты по устройствам можно получать по мере готовности через irun() """
     if args.config == "running":
         fetcher = annet.deploy.get_fetcher()
         ann_gen.live_configs = annet.lib.do_async(
@@ -361,8 +378,7 @@ def diff(
     if args.show_hosts_progress:
         fqdns = {k: v for k, v in loader.device_fqdns.items() if k in device_ids}
         pool.add_callback(PoolProgressLogger(fqdns))
-
-    return pool.run(device_ids, args.tolerate_fails, args.strict_exit_code)
+    return pool
 
 
 def collapse_texts(texts: Mapping[str, str | Generator[str, None, None]]) -> Mapping[Tuple[str, ...], str]:
@@ -9,6 +9,7 @@ import textwrap
 import time
 from collections import OrderedDict as odict
 from operator import itemgetter
+from types import MappingProxyType
 from typing import (
     Any,
     Dict,
@@ -17,6 +18,7 @@ from typing import (
     Iterable,
     Iterator,
     List,
+    Mapping,
     Optional,
     Tuple,
     Union,
@@ -811,6 +813,10 @@ class Loader:
             raise KeyError(f"Unknown device with id {device_id}")
         return self._devices_map[device_id]
 
+    @property
+    def devices_map(self) -> Mapping[Any, Device]:
+        return MappingProxyType(self._devices_map)
+
     @property
     def device_ids(self) -> List[Any]:
         return list(self._devices_map)
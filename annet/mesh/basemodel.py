@@ -1,6 +1,7 @@
 from abc import ABC
 from copy import copy
 from enum import Enum
+from itertools import chain
 from dataclasses import is_dataclass, replace, fields, MISSING
 from typing import (
     TypeVar, Any, Annotated, get_origin, get_type_hints, get_args, Callable, Union, ClassVar, overload, cast,
@@ -143,7 +144,12 @@ ModelT = TypeVar("ModelT", bound=BaseMeshModel)
 
 def _merge(a: ModelT, b: BaseMeshModel) -> ModelT:
     result = copy(a)
-    for attr_name, merger in a._field_mergers.items():
+    field_mergers = a._field_mergers
+    # fields unset on both sides are left as is by any merger, so only set ones are visited
+    for attr_name in dict.fromkeys(chain(vars(a), vars(b))):
+        merger = field_mergers.get(attr_name)
+        if merger is None:
+            continue
         aval = getattr(a, attr_name, Special.NOT_SET)
         bval = getattr(b, attr_name, Special.NOT_SET)
         if is_dataclass(aval) and is_dataclass(bval):
@@ -22,7 +22,7 @@ from .registry import (
 logger = getLogger(__name__)
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class TargetInterface:
     subif: int | None = None
     svi: int | None = None
@@ -30,7 +30,7 @@ class TargetInterface:
     port: str | None = None
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class PeerKey:
     fqdn: str
     addr: str
@@ -15,7 +15,7 @@ PeerDTO = Union[DirectPeerDTO, IndirectPeerDTO, VirtualPeerDTO]
 LocalDTO = Union[DirectPeerDTO, IndirectPeerDTO, VirtualLocalDTO]
 
 
-@dataclass
+@dataclass(slots=True)
 class InterfaceChanges:
     addr: Optional[str] = None
     lag: Optional[int] = None
@@ -32,6 +32,8 @@ class InterfaceChanges:
 
 
 class ObjMapping:
+    __slots__ = ("obj",)
+
     def __init__(self, obj):
         self.obj = obj
 
@@ -3,17 +3,36 @@ REST API для приложения annet
 Предоставляет HTTP endpoints для команд ann get, ann diff, ann patch и ann deploy
 """
 
-from typing import Dict, List, Optional, Any
-from contextlib import asynccontextmanager
+import asyncio
+import functools
+import multiprocessing
+import operator
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, List, Literal, Mapping, Optional, Any, Set, Tuple, Union
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field, replace
 
+import anyio.to_thread
 from fastapi import FastAPI, HTTPException, Query as QueryParam
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 import uvicorn
 
-from annet import api, cli_args, filtering
-from annet.deploy import get_fetcher, get_deployer
-from annet.gen import Loader
-from annet.storage import get_storage, Query
+from annet import api, cli_args, filtering, generators
+from annet.deploy import DeployDriver, Fetcher, get_fetcher, get_deployer
+from annet.filtering import Filterer
+from annet.gen import Loader, _old_resolve_gens
+from annet.parallel import TaskResult
+from annet.storage import get_storage, Query, StorageProvider
 from annet.api import Deployer
 from annet.output import output_driver_connector
 from annet.argparse import Arg
@@ -98,32 +117,251 @@ class DeployResult(BaseModel):
     error: Optional[str] = None
 
 
+class DeployJob(BaseModel):
+    """Состояние фоновой задачи deploy"""
+    job_id: str
+    status: str = Field(..., description="Статус задачи: 'running', 'done', 'failed' или 'cancelled'")
+    result: Optional[ApiResponse] = None
+    error: Optional[str] = None
+
+
+class ApiError(Exception):
+    """Ошибка выполнения команды, передаваемая из пула обработчиков"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(status_code, detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
 # Глобальные переменные для кеширования
-_storage_connector = None
+_storage_connector: Optional[StorageProvider] = None
+_conf_params: Optional[Dict[str, Any]] = None
+_storage_lock = threading.Lock()
 _filterer = None
+# Пул процессов для тяжелых команд (gen/diff/patch/deploy) и фабрика для его пересоздания
+_pool: Optional[Executor] = None
+_pool_factory: Optional[Callable[[], Executor]] = None
+# Менеджер очередей, через которые процессы пула передают строки потокового ответа
+_manager = None
+# Кеш устройств по сигнатуре запроса: key -> (время истечения, устройства).
+# Генераторы хранят состояние между вызовами, поэтому кешируются только устройства
+_DEVICE_CACHE_SIZE = 128
+_DEVICE_CACHE_TTL = 60.0
+_device_cache: "OrderedDict[Tuple, Tuple[float, List[Any]]]" = OrderedDict()
+_device_lock = threading.Lock()
+# Поколение кеша устройств в общей памяти: увеличивается при сбросе кеша в любом процессе,
+# каждый процесс пула сверяет с ним свое поколение при обращении к кешу
+_device_generation = None
+_device_cache_generation = 0
+# Фоновые задачи deploy по job_id, future в пуле - пока задача не завершилась.
+# Задачи хранятся в памяти процесса, поэтому сервер должен работать одним воркером
+_deploy_jobs: Dict[str, DeployJob] = {}
+_deploy_futures: Dict[str, Future] = {}
+# Завершенные задачи: job_id -> время завершения, хранятся _DEPLOY_JOB_TTL секунд,
+# но не более _DEPLOY_JOBS_MAX последних
+_DEPLOY_JOB_TTL = 3600.0
+_DEPLOY_JOBS_MAX = 1000
+_deploy_finished: "OrderedDict[str, float]" = OrderedDict()
+# сильные ссылки на asyncio-задачи, иначе их может собрать GC
+_deploy_tasks: Set[asyncio.Task] = set()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Инициализация и очистка ресурсов приложения"""
-    global _storage_connector, _filterer
+    global _storage_connector, _conf_params, _filterer, _pool, _pool_factory, _device_generation, _manager
     
     # Инициализация
     try:
-        _storage_connector, _ = get_storage()
+        _get_storage()
         _filterer = filtering.filterer_connector.get()
     except RuntimeError as e:
         print(f"Warning: {e}. Some API endpoints may not work without proper storage configuration.")
-        _storage_connector = None
         _filterer = None
+    warmup = _storage_connector is not None and os.environ.get("ANNET_WARMUP", "1") == "1"
+    if warmup:
+        # синхронно: до создания пула в процессе не должно быть других потоков
+        _warmup()
+    workers = os.cpu_count()
+    _device_generation = multiprocessing.Value("Q", 0)
+    _manager = multiprocessing.Manager()
+    # процессы, созданные через fork, наследуют уже прогретый процесс сервера,
+    # прогревать их отдельно нужно только при других методах запуска (spawn в macOS и Windows)
+    worker_warmup = warmup and multiprocessing.get_start_method() != "fork"
+    _pool_factory = functools.partial(_create_pool, workers, worker_warmup, _device_generation)
+    _pool = _pool_factory()
+    if worker_warmup:
+        # ждем прогрева всех процессов пула до первого запроса
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(_pool, int) for _ in range(workers)))
     
     yield
     
     # Очистка ресурсов
+    _pool.shutdown(wait=True, cancel_futures=True)
+    _pool = None
+    _pool_factory = None
+    _device_generation = None
+    _manager.shutdown()
+    _manager = None
     _storage_connector = None
+    _conf_params = None
     _filterer = None
 
 
+def _create_pool(workers: int, warmup: bool, generation) -> ProcessPoolExecutor:
+    """
+    Пул процессов для команд. Как и annet.parallel, пул использует метод запуска
+    по умолчанию (fork в Linux), чтобы процессы наследовали коннекторы, заданные
+    при запуске сервера. С fork ProcessPoolExecutor создает все процессы при первой
+    задаче, поэтому она отправляется сразу: fork выполняется только здесь, а не
+    посреди обработки запросов, когда в процессе уже работают другие потоки
+    """
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(generation, warmup))
+    pool.submit(int)
+    return pool
+
+
+def _restart_pool(broken: Executor):
+    """
+    Пересоздать пул после падения одного из процессов (OOM, segfault в драйвере):
+    ProcessPoolExecutor в состоянии BrokenProcessPool не принимает новых задач
+    """
+    global _pool
+    if _pool is broken and _pool_factory is not None:
+        print("Warning: process pool is broken, restarting it")
+        broken.shutdown(wait=False, cancel_futures=True)
+        _pool = _pool_factory()
+
+
+def _get_storage() -> Tuple[StorageProvider, Dict[str, Any]]:
+    """
+    Коннектор хранилища и его параметры, вычисляются один раз на процесс.
+    lifespan заполняет кеш до создания пула, процессы пула, созданные через fork,
+    наследуют его, при других методах запуска - вычисляют сами
+    """
+    global _storage_connector, _conf_params
+    if _storage_connector is None:
+        with _storage_lock:
+            if _storage_connector is None:
+                connector, conf_params = get_storage()
+                _conf_params = conf_params
+                _storage_connector = connector
+    return _storage_connector, _conf_params
+
+
+@functools.cache
+def _get_deploy_connectors() -> Tuple[Filterer, Fetcher, DeployDriver]:
+    """Фильтр, fetcher и deploy driver из контекста, создаются один раз на процесс"""
+    return filtering.filterer_connector.get(), get_fetcher(), get_deployer()
+
+
+def _device_key(query_data: DeviceQuery, args: "AnnetArgs") -> Tuple:
+    """Сигнатура запроса: все параметры, от которых зависит состав устройств"""
+    return (
+        tuple(query_data.query),
+        query_data.hosts_range,
+        args.no_mesh,
+    )
+
+
+class _CachedLoader(Loader):
+    """Loader с уже загруженными устройствами, генераторы создаются заново"""
+
+    def __init__(self, storage, args: "AnnetArgs", devices: List[Any]):
+        self._cached_devices = devices
+        super().__init__(storage, args=args)
+
+    def _preload(self) -> None:
+        storage, = self._storages
+        for device in self._cached_devices:
+            self._devices_map[device.id] = device
+        self._gens.update(_old_resolve_gens(self._args, storage, self._cached_devices))
+
+
+@contextmanager
+def _open_loader(query_data: DeviceQuery, args: "AnnetArgs") -> Iterator[Loader]:
+    """
+    Loader для запроса. Устройства кешируются на _DEVICE_CACHE_TTL секунд,
+    хранилище открывается только на время запроса
+    """
+    key = _device_key(query_data, args)
+    devices = _get_cached_devices(key)
+    connector, conf_params = _get_storage()
+    storage_opts = connector.opts().parse_params(conf_params, args)
+    with connector.storage()(storage_opts) as storage:
+        if devices is not None:
+            yield _CachedLoader(storage, args, devices)
+            return
+        loader = Loader(storage, args=args)
+        if loader.devices:
+            _cache_devices(key, loader.devices)
+        yield loader
+
+
+def _get_cached_devices(key: Tuple) -> Optional[List[Any]]:
+    """Устройства из кеша, None - если их нет или истек TTL"""
+    global _device_cache_generation
+    generation = _device_generation.value if _device_generation is not None else 0
+    with _device_lock:
+        if generation != _device_cache_generation:
+            _device_cache.clear()
+            _device_cache_generation = generation
+        entry = _device_cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del _device_cache[key]
+            return None
+        _device_cache.move_to_end(key)
+        return entry[1]
+
+
+def _cache_devices(key: Tuple, devices: List[Any]):
+    """Сохранить устройства в кеш, вытесняя самые старые записи"""
+    with _device_lock:
+        _device_cache[key] = (time.monotonic() + _DEVICE_CACHE_TTL, devices)
+        _device_cache.move_to_end(key)
+        while len(_device_cache) > _DEVICE_CACHE_SIZE:
+            _device_cache.popitem(last=False)
+
+
+def _init_worker(generation, warmup: bool):
+    """Инициализация процесса пула: общее поколение кеша устройств и прогрев"""
+    global _device_generation
+    _device_generation = generation
+    if warmup:
+        _warmup()
+
+
+def _warmup():
+    """
+    Прогрев процесса: открытие хранилища, импорт и создание генераторов,
+    коннекторы деплоя, чтобы первый запрос не платил за холодный старт
+    """
+    try:
+        connector, conf_params = _get_storage()
+        storage_opts = connector.opts().parse_params(conf_params, _ARGS_TEMPLATE)
+        with connector.storage()(storage_opts) as storage:
+            generators.build_generators(storage, gens=_ARGS_TEMPLATE)
+        _get_deploy_connectors()
+    except Exception as e:
+        print(f"Warning: warm-up failed: {e}")
+
+
+def _invalidate_devices():
+    """
+    Сбросить кеш устройств, например после изменения их конфигурации.
+    Остальные процессы пула сбрасывают свои кеши при следующем обращении к ним
+    """
+    if _device_generation is not None:
+        with _device_generation.get_lock():
+            _device_generation.value += 1
+    with _device_lock:
+        _device_cache.clear()
+
+
 # Создание FastAPI приложения
 app = FastAPI(
     title="Annet REST API",
@@ -131,106 +369,66 @@ app = FastAPI(
     version="1.0.0",
     lifespan=lifespan
 )
+# конфиги и diff хорошо сжимаются, сжимаем ответы для клиентов с Accept-Encoding: gzip
+app.add_middleware(GZipMiddleware, minimum_size=1000, compresslevel=6)
 
 
-def _create_cli_args(query_data: DeviceQuery, options: GenerationOptions, args_class):
-    """Создание объекта аргументов CLI из данных API"""
-    # Создаем объект Query
-    storage, _ = get_storage()
-    query_type = storage.query()
-    
-    # Парсим hosts_range если указан
-    hosts_range = None
-    if query_data.hosts_range:
-        if query_data.hosts_range.isdigit():
-            hosts_range = slice(0, int(query_data.hosts_range))
-        elif ":" in query_data.hosts_range:
-            start_str, stop_str = query_data.hosts_range.split(":", 1)
-            stop = None if not stop_str else int(stop_str)
-            hosts_range = slice(int(start_str), stop)
-    
-    query = query_type.new(query_data.query, hosts_range=hosts_range)
-    
-    # Создаем объект аргументов
-    print("Создаем объект аргументов")
-    args_dict = {
-        'query': query,
-        'hosts_range': hosts_range or [],
-        'config': options.config,
-        'allowed_gens': options.allowed_gens or [],
-        'excluded_gens': options.excluded_gens or [],
-        'force_enabled': options.force_enabled or [],
-        'no_acl': options.no_acl,
-        'acl_safe': options.acl_safe,
-        'filter_acl': options.filter_acl,
-        'filter_ifaces': options.filter_ifaces or [],
-        'filter_peers': options.filter_peers or [],
-        'filter_policies': options.filter_policies or [],
-        'parallel': options.parallel,
-        'tolerate_fails': options.tolerate_fails,
-        'strict_exit_code': False,
-        'annotate': options.annotate,
-        'indent': options.indent,
-        'no_mesh': False,
-        'profile': False,
-        'required_packages_check': False,
-        'fail_on_empty_config': False,
-        'generators_context': None,
-        'no_acl_exclusive': False,
-        'max_tasks': None,
-        'ignore_disabled': False,
-        'show_hosts_progress': False,
-    }
-    
-    # Добавляем специфичные для diff опции
-    if hasattr(options, 'show_rules'):
-        args_dict.update({
-            'show_rules': options.show_rules,
-            'clear': options.clear,
-            'no_collapse': options.no_collapse,
-        })
-    
-    # Добавляем специфичные для patch опции
-    if hasattr(options, 'add_comments'):
-        args_dict.update({
-            'add_comments': options.add_comments,
-        })
-    
-    # Добавляем специфичные для deploy опции
-    if hasattr(options, 'no_ask_deploy'):
-        args_dict.update({
-            'no_ask_deploy': options.no_ask_deploy,
-            'no_check_diff': options.no_check_diff,
-            'dont_commit': options.dont_commit,
-            'rollback': options.rollback,
-            'max_parallel': options.max_deploy,
-            'entire_reload': cli_args.EntireReloadFlag(options.entire_reload),
-            'ask_pass': False,
-            'max_slots': 30,
-            'no_progress': True,
-            'connect_timeout': 20.0,
-            'log_json': False,
-            'log_dest': '/dev/null',
-            'log_nogroup': False,
-        })
-    
-    # Создаем объект аргументов нужного типа
-    return MockArgs(**args_dict)
-
-class MockArgs:
-    def __init__(self, **kwargs):
-        print("KWARGS", kwargs)
-        for key, value in kwargs.items():
-            print(key, value)
-            setattr(self, key, value)
-        # self._enum_args = {}
-    
+@dataclass(frozen=True, slots=True)
+class AnnetArgs:
+    """Аргументы команд annet, собранные из запроса API"""
+    query: Any = None
+    hosts_range: Any = field(default_factory=list)
+    config: str = "running"
+    allowed_gens: List[str] = field(default_factory=list)
+    excluded_gens: List[str] = field(default_factory=list)
+    force_enabled: List[str] = field(default_factory=list)
+    no_acl: bool = False
+    acl_safe: bool = False
+    filter_acl: str = ""
+    filter_ifaces: List[str] = field(default_factory=list)
+    filter_peers: List[str] = field(default_factory=list)
+    filter_policies: List[str] = field(default_factory=list)
+    parallel: int = 1
+    tolerate_fails: bool = False
+    strict_exit_code: bool = False
+    annotate: bool = False
+    indent: str = "  "
+    no_mesh: bool = False
+    profile: bool = False
+    required_packages_check: bool = False
+    fail_on_empty_config: bool = False
+    generators_context: Optional[str] = None
+    no_acl_exclusive: bool = False
+    max_tasks: Optional[int] = None
+    ignore_disabled: bool = False
+    show_hosts_progress: bool = False
+    # diff
+    show_rules: bool = False
+    clear: bool = False
+    no_collapse: bool = False
+    # patch
+    add_comments: bool = False
+    # deploy
+    no_ask_deploy: bool = True
+    no_check_diff: bool = False
+    dont_commit: bool = False
+    rollback: bool = False
+    max_parallel: int = 0
+    entire_reload: cli_args.EntireReloadFlag = cli_args.EntireReloadFlag.yes
+    ask_pass: bool = False
+    max_slots: int = 30
+    no_progress: bool = True
+    connect_timeout: float = 20.0
+    log_json: bool = False
+    log_dest: str = "/dev/null"
+    log_nogroup: bool = False
+
     def stdin(self, filter_acl=None, config=None):
         return {
-            'filter_acl': None,
-            'config': None,
+            "filter_acl": None,
+            "config": None,
         }
-    
+
     @classmethod
     def _enum_args(cls) -> Dict[str, Arg]:
         ret = {}
@@ -240,6 +438,85 @@ class MockArgs:
                     ret[name] = value
         return ret
 
+
+# Значения по умолчанию, запрос переопределяет только свои поля
+_ARGS_TEMPLATE = AnnetArgs()
+
+# hosts_range: "10" или "10:20", "10:"
+_HOSTS_RANGE_RE = re.compile(r"^(\d+)(?::(\d*))?$")
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_hosts_range(hosts_range: Optional[str]) -> Optional[slice]:
+    """Разбор диапазона хостов в slice, None если диапазон не задан или не распознан"""
+    if not hosts_range:
+        return None
+    match = _HOSTS_RANGE_RE.match(hosts_range)
+    if match is None:
+        return None
+    start, stop = match.groups()
+    if stop is None:
+        return slice(0, int(start))
+    return slice(int(start), int(stop) if stop else None)
+
+
+def _create_cli_args(query_data: DeviceQuery, options: GenerationOptions, args_class) -> AnnetArgs:
+    """Создание объекта аргументов CLI из данных API"""
+    # Создаем объект Query
+    storage, _ = _get_storage()
+    query_type = storage.query()
+
+    hosts_range = _parse_hosts_range(query_data.hosts_range)
+    query = query_type.new(query_data.query, hosts_range=hosts_range)
+
+    # Создаем объект аргументов
+    overrides = dict(
+        query=query,
+        hosts_range=hosts_range or [],
+        config=options.config,
+        allowed_gens=options.allowed_gens or [],
+        excluded_gens=options.excluded_gens or [],
+        force_enabled=options.force_enabled or [],
+        no_acl=options.no_acl,
+        acl_safe=options.acl_safe,
+        filter_acl=options.filter_acl,
+        filter_ifaces=options.filter_ifaces or [],
+        filter_peers=options.filter_peers or [],
+        filter_policies=options.filter_policies or [],
+        parallel=options.parallel,
+        tolerate_fails=options.tolerate_fails,
+        annotate=options.annotate,
+        indent=options.indent,
+    )
+
+    # Добавляем специфичные для diff опции
+    if isinstance(options, DiffOptions):
+        overrides.update(
+            show_rules=options.show_rules,
+            clear=options.clear,
+            no_collapse=options.no_collapse,
+        )
+
+    # Добавляем специфичные для patch опции
+    if isinstance(options, PatchOptions):
+        overrides.update(
+            add_comments=options.add_comments,
+        )
+
+    # Добавляем специфичные для deploy опции
+    if isinstance(options, DeployOptions):
+        overrides.update(
+            no_ask_deploy=options.no_ask_deploy,
+            no_check_diff=options.no_check_diff,
+            dont_commit=options.dont_commit,
+            rollback=options.rollback,
+            max_parallel=options.max_deploy,
+            entire_reload=cli_args.EntireReloadFlag(options.entire_reload),
+        )
+
+    return replace(_ARGS_TEMPLATE, **overrides)
+
+
 @app.get("/", response_model=ApiResponse)
 async def root():
     """Корневой endpoint"""
@@ -256,290 +533,509 @@ async def health_check():
     return {"status": "healthy"}
 
 
-@app.post("/api/v1/gen", response_model=ApiResponse)
-async def generate_config(query: DeviceQuery, options: GenerationOptions):
+def _run_gen(query: DeviceQuery, options: GenerationOptions) -> ApiResponse:
+    """Генерация конфигурации, выполняется в пуле процессов"""
+    with _load_devices(query, options, cli_args.ShowGenOptions) as (args, loader, devices):
+        task_results = list(api.gen_pool(args, loader).irun(loader.device_ids, args.tolerate_fails))
+        return ApiResponse(
+            success=True,
+            message=f"Generated configuration for {_count_succeeded(task_results)} devices",
+            data=list(_iter_results(task_results, devices, _generation_results)),
+        )
+
+
+def _run_diff(query: DeviceQuery, options: DiffOptions) -> ApiResponse:
+    """Diff конфигурации, выполняется в пуле процессов. Одинаковые diff'ы разных устройств группируются"""
+    with _load_devices(query, options, cli_args.ShowDiffOptions) as (args, loader, devices):
+        task_results = list(api.diff_pool(args, loader, loader.device_ids).irun(loader.device_ids, args.tolerate_fails))
+        diffs = {
+            devices[task_result.device_id]: task_result.result
+            for task_result in task_results
+            if task_result.exc is None
+        }
+        errors = [
+            f"{devices[task_result.device_id].hostname}: {task_result.exc}"
+            for task_result in task_results
+            if task_result.exc is not None
+        ]
+        return ApiResponse(
+            success=True,
+            message=f"Generated diff for {len(diffs)} devices",
+            data=_diff_results(args, diffs),
+            errors=errors if errors else None
+        )
+
+
+def _run_patch(query: DeviceQuery, options: PatchOptions) -> ApiResponse:
+    """Генерация патча, выполняется в пуле процессов"""
+    with _load_devices(query, options, cli_args.ShowPatchOptions) as (args, loader, devices):
+        task_results = list(api.patch_pool(args, loader).irun(loader.device_ids, args.tolerate_fails))
+        return ApiResponse(
+            success=True,
+            message=f"Generated patch for {_count_succeeded(task_results)} devices",
+            data=list(_iter_results(task_results, devices, _generation_results)),
+        )
+
+
+def _run_deploy(query: DeviceQuery, options: DeployOptions) -> ApiResponse:
+    """Деплой конфигурации, выполняется в пуле процессов"""
+    # Создаем аргументы CLI
+    args = _create_cli_args(query, options, cli_args.DeployOptions)
+
+    # Создаем loader
+    with _open_loader(query, args) as loader:
+        if not loader.devices:
+            raise ApiError(404, f"No devices found for query: {query.query}")
+
+        # Создаем необходимые объекты для деплоя
+        deployer = Deployer(args)
+        filterer, fetcher, deploy_driver = _get_deploy_connectors()
+
+        # Выполняем деплой
+        exit_code = api.deploy(
+            args=args,
+            loader=loader,
+            deployer=deployer,
+            deploy_driver=deploy_driver,
+            filterer=filterer,
+            fetcher=fetcher,
+        )
+
+    # Формируем результат
+    results = []
+    for hostname, result in deployer.deploy_cmds.items():
+        if isinstance(result, Exception):
+            results.append(DeployResult(
+                device=hostname,
+                success=False,
+                duration=0.0,
+                error=str(result)
+            ))
+        else:
+            results.append(DeployResult(
+                device=hostname,
+                success=True,
+                duration=0.0  # TODO: получить реальное время
+            ))
+
+    # Добавляем ошибки из failed_configs
+    for hostname, error in deployer.failed_configs.items():
+        results.append(DeployResult(
+            device=hostname,
+            success=False,
+            duration=0.0,
+            error=str(error)
+        ))
+
+    if exit_code == 0:
+        _invalidate_devices()
+
+    return ApiResponse(
+        success=exit_code == 0,
+        message=f"Deploy completed with exit code {exit_code}",
+        data=results
+    )
+
+
+def _call_in_worker(func: Callable[..., ApiResponse], *args) -> ApiResponse:
+    """
+    Обертка над командой в пуле процессов: исключения приводятся к ApiError,
+    так как произвольные исключения не всегда переживают pickle
     """
-    Генерация конфигурации для устройств (аналог команды 'ann gen')
-    """    
     try:
-        # Создаем аргументы CLI
-        args = _create_cli_args(query, options, cli_args.ShowGenOptions)
-        
-        # Создаем loader
-        connector, conf_params = get_storage()
-        storage_opts = connector.opts().parse_params(conf_params, args)
-        
-        with connector.storage()(storage_opts) as storage:
-            loader = Loader(storage, args=args)
-            
-            if not loader.devices:
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"No devices found for query: {query.query}"
-                )
-            
-            # Выполняем генерацию
-            success, fail = api.gen(args, loader)
-            
-            # Формируем результат
-            results = []
-            for device_id, items in success.items():
-                device = loader.get_device(device_id)
-                for item in items:
-                    results.append(GenerationResult(
-                        device=device.hostname,
-                        content=item[1],
-                        success=True
-                    ))
-            
-            # Добавляем ошибки
-            for device_id, error in fail.items():
-                device = loader.get_device(device_id)
-                results.append(GenerationResult(
-                    device=device.hostname,
-                    content="",
-                    success=False,
-                    error=str(error)
-                ))
-            
-            return ApiResponse(
-                success=True,
-                message=f"Generated configuration for {len(success)} devices",
-                data=results
-            )
-            
+        return func(*args)
+    except ApiError:
+        raise
+    except Exception as e:
+        raise ApiError(500, _error_detail(e)) from None
+
+
+def _error_detail(e: Exception) -> str:
+    """Текст ошибки с типом исключения: str() многих исключений пустой"""
+    message = str(e)
+    return f"{type(e).__name__}: {message}" if message else type(e).__name__
+
+
+_POOL_BROKEN_DETAIL = "Worker process terminated abruptly, the process pool is restarted; retry the request"
+
+
+def _submit(func: Callable[..., ApiResponse], *args) -> Future:
+    """Отправить команду в пул, пересоздав его, если он сломан"""
+    pool = _pool
+    try:
+        return pool.submit(_call_in_worker, func, *args)
+    except BrokenProcessPool:
+        _restart_pool(pool)
+        raise HTTPException(status_code=503, detail=_POOL_BROKEN_DETAIL)
+
+
+async def _run_in_pool(func: Callable[..., ApiResponse], *args) -> ApiResponse:
+    """Выполнить блокирующую команду в пуле, не занимая event loop"""
+    pool = _pool
+    return await _wait(_submit(func, *args), pool)
+
+
+async def _wait(future: Future, pool: Executor) -> Any:
+    """Дождаться результата команды в пуле, ошибки приводятся к HTTPException"""
+    try:
+        return await asyncio.wrap_future(future)
+    except ApiError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except BrokenProcessPool:
+        # команда не повторяется: она сама могла уронить процесс
+        _restart_pool(pool)
+        raise HTTPException(status_code=503, detail=_POOL_BROKEN_DETAIL)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=500, detail=_error_detail(e))
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+_STREAM_PARAM = QueryParam(False, description="Вернуть результат построчно в формате NDJSON")
+_STREAM_WAIT_TIMEOUT = 0.5
+
+
+def _iter_ndjson(envelope: ApiResponse, rows: Iterable[BaseModel]) -> Iterator[str]:
+    """Первая строка - ответ без data, далее по строке на каждый элемент data"""
+    yield envelope.model_dump_json(exclude={"data"}) + "\n"
+    for row in rows:
+        yield row.model_dump_json() + "\n"
+
+
+@contextmanager
+def _load_devices(
+    query: DeviceQuery, options: GenerationOptions, args_class,
+) -> Iterator[Tuple["AnnetArgs", Loader, Mapping[Any, Any]]]:
+    """Аргументы, Loader и устройства запроса, 404 - если устройства не найдены"""
+    args = _create_cli_args(query, options, args_class)
+    with _open_loader(query, args) as loader:
+        devices = loader.devices_map
+        if not devices:
+            raise ApiError(404, f"No devices found for query: {query.query}")
+        yield args, loader, devices
+
+
+def _generation_results(device, task_result: TaskResult) -> List[GenerationResult]:
+    """Результаты gen/patch одного устройства"""
+    if task_result.exc is not None:
+        return [GenerationResult(device=device.hostname, content="", success=False, error=str(task_result.exc))]
+    return [
+        GenerationResult(device=device.hostname, content=item[1], success=True)
+        for item in task_result.result
+    ]
+
+
+def _diff_results(args: "AnnetArgs", diffs: Mapping[Any, Any]) -> List[DiffResult]:
+    """Результаты diff устройств, без --no-collapse одинаковые diff'ы группируются"""
+    from annet.diff import gen_sort_diff
+
+    return [
+        DiffResult(devices=[dest_name], diff="".join(diff_content), success=True)
+        for dest_name, diff_content, _ in gen_sort_diff(diffs, args)
+    ]
+
+
+def _device_diff_results(args: "AnnetArgs", device, task_result: TaskResult) -> List[DiffResult]:
+    """Результаты diff одного устройства"""
+    if task_result.exc is not None:
+        return [DiffResult(devices=[device.hostname], diff="", success=False, error=str(task_result.exc))]
+    return _diff_results(args, {device: task_result.result})
+
+
+def _iter_results(
+    task_results: Iterable[TaskResult],
+    devices: Mapping[Any, Any],
+    results_func: Callable[[Any, TaskResult], List[BaseModel]],
+) -> Iterator[BaseModel]:
+    """Элементы data по мере готовности устройств"""
+    for task_result in task_results:
+        yield from results_func(devices[task_result.device_id], task_result)
+
+
+def _count_succeeded(task_results: Iterable[TaskResult]) -> int:
+    """Число устройств, для которых команда выполнилась без ошибок"""
+    return sum(task_result.exc is None for task_result in task_results)
+
+
+def _stream_gen(query: DeviceQuery, options: GenerationOptions) -> Iterator[str]:
+    """Генерация конфигурации построчно, по мере готовности устройств"""
+    with _load_devices(query, options, cli_args.ShowGenOptions) as (args, loader, devices):
+        task_results = api.gen_pool(args, loader).irun(loader.device_ids, args.tolerate_fails)
+        yield from _iter_ndjson(
+            ApiResponse(success=True, message=f"Generating configuration for {len(devices)} devices"),
+            _iter_results(task_results, devices, _generation_results),
+        )
+
+
+def _stream_diff(query: DeviceQuery, options: DiffOptions) -> Iterator[str]:
+    """
+    Diff построчно, по мере готовности устройств. В отличие от обычного ответа,
+    одинаковые diff'ы разных устройств не группируются
+    """
+    with _load_devices(query, options, cli_args.ShowDiffOptions) as (args, loader, devices):
+        task_results = api.diff_pool(args, loader, loader.device_ids).irun(loader.device_ids, args.tolerate_fails)
+        yield from _iter_ndjson(
+            ApiResponse(success=True, message=f"Generating diff for {len(devices)} devices"),
+            _iter_results(task_results, devices, functools.partial(_device_diff_results, args)),
+        )
+
+
+def _stream_patch(query: DeviceQuery, options: PatchOptions) -> Iterator[str]:
+    """Генерация патча построчно, по мере готовности устройств"""
+    with _load_devices(query, options, cli_args.ShowPatchOptions) as (args, loader, devices):
+        task_results = api.patch_pool(args, loader).irun(loader.device_ids, args.tolerate_fails)
+        yield from _iter_ndjson(
+            ApiResponse(success=True, message=f"Generating patch for {len(devices)} devices"),
+            _iter_results(task_results, devices, _generation_results),
+        )
+
+
+def _stream_in_worker(func: Callable[..., Iterator[str]], query: DeviceQuery, options: GenerationOptions, lines):
+    """Выполнить команду в пуле, передавая строки ответа в очередь по мере готовности"""
+    try:
+        for line in func(query, options):
+            lines.put(line)
+    finally:
+        lines.put(None)
+
+
+async def _next_lines(lines, future: Future) -> List[Optional[str]]:
+    """
+    Забрать из очереди все готовые строки, дождавшись хотя бы одной.
+    None в конце списка - команда завершилась, пустой список - процесс пула
+    завершился, не отправив ответ до конца
+    """
+    while True:
+        try:
+            # ожидание с таймаутом, чтобы заметить аварийное завершение процесса пула
+            batch = [await anyio.to_thread.run_sync(lines.get, True, _STREAM_WAIT_TIMEOUT)]
+        except queue.Empty:
+            batch = []
+        try:
+            while True:
+                batch.append(lines.get_nowait())
+        except queue.Empty:
+            pass
+        if batch or future.done():
+            return batch
+
+
+async def _iter_stream(batch: List[Optional[str]], lines, future: Future, pool: Executor) -> AsyncIterator[str]:
+    """Строки потокового ответа по мере их поступления от процесса пула"""
+    while batch:
+        yield "".join(line for line in batch if line is not None)
+        if batch[-1] is None:
+            break
+        batch = await _next_lines(lines, future)
+    try:
+        await _wait(future, pool)
+    except HTTPException as e:
+        # заголовок уже отправлен, ошибку передаем последней строкой
+        yield ApiResponse(success=False, message=str(e.detail)).model_dump_json() + "\n"
+
+
+async def _run_command(
+    func: Callable[..., ApiResponse],
+    stream_func: Callable[..., Iterator[str]],
+    query: DeviceQuery,
+    options: GenerationOptions,
+    stream: bool,
+) -> Union[ApiResponse, StreamingResponse]:
+    if not stream:
+        return await _run_in_pool(func, query, options)
+
+    pool = _pool
+    lines = _manager.Queue()
+    future = _submit(_stream_in_worker, stream_func, query, options, lines)
+    batch = await _next_lines(lines, future)
+    if not batch or batch[0] is None:
+        # команда завершилась до первой строки: ошибка отдается обычным HTTP-статусом
+        await _wait(future, pool)
+        raise HTTPException(status_code=500, detail="Command finished without a response")
+    return StreamingResponse(_iter_stream(batch, lines, future, pool), media_type=NDJSON_MEDIA_TYPE)
+
+
+@app.post("/api/v1/gen", response_model=ApiResponse)
+async def generate_config(query: DeviceQuery, options: GenerationOptions, stream: bool = _STREAM_PARAM):
+    """
+    Генерация конфигурации для устройств (аналог команды 'ann gen')
+    """
+    return await _run_command(_run_gen, _stream_gen, query, options, stream)
 
 
 @app.post("/api/v1/diff", response_model=ApiResponse)
-async def show_diff(query: DeviceQuery, options: DiffOptions):
+async def show_diff(query: DeviceQuery, options: DiffOptions, stream: bool = _STREAM_PARAM):
     """
     Показать diff конфигурации (аналог команды 'ann diff')
     """
-    try:
-        # Создаем аргументы CLI
-        args = _create_cli_args(query, options, cli_args.ShowDiffOptions)
-        
-        # Создаем loader
-        connector, conf_params = get_storage()
-        storage_opts = connector.opts().parse_params(conf_params, args)
-        
-        with connector.storage()(storage_opts) as storage:
-            loader = Loader(storage, args=args)
-            
-            if not loader.devices:
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"No devices found for query: {query.query}"
-                )
-            
-            # Выполняем diff
-            success, fail = api.diff(args, loader, loader.device_ids)
-            
-            # Формируем результат
-            from annet.diff import gen_sort_diff
-            results = []
-            
-            diffs_by_device = {loader.get_device(k): v for k, v in success.items()}
-            for dest_name, diff_content, _ in gen_sort_diff(diffs_by_device, args):
-                if hasattr(diff_content, '__iter__') and not isinstance(diff_content, str):
-                    diff_text = ''.join(diff_content)
-                else:
-                    diff_text = str(diff_content)
-                
-                results.append(DiffResult(
-                    devices=[dest_name],
-                    diff=diff_text,
-                    success=True
-                ))
-            
-            # Добавляем ошибки
-            errors = []
-            for device_id, error in fail.items():
-                device = loader.get_device(device_id)
-                errors.append(f"{device.hostname}: {str(error)}")
-            
-            return ApiResponse(
-                success=True,
-                message=f"Generated diff for {len(success)} devices",
-                data=results,
-                errors=errors if errors else None
-            )
-            
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await _run_command(_run_diff, _stream_diff, query, options, stream)
 
 
 @app.post("/api/v1/patch", response_model=ApiResponse)
-async def generate_patch(query: DeviceQuery, options: PatchOptions):
+async def generate_patch(query: DeviceQuery, options: PatchOptions, stream: bool = _STREAM_PARAM):
     """
     Генерация патча для устройств (аналог команды 'ann patch')
     """
+    return await _run_command(_run_patch, _stream_patch, query, options, stream)
+
+
+async def _deploy_job(job_id: str, future: Future, pool: Executor):
+    """Ожидание deploy в пуле с сохранением результата в _deploy_jobs"""
+    job = _deploy_jobs[job_id]
     try:
-        # Создаем аргументы CLI
-        args = _create_cli_args(query, options, cli_args.ShowPatchOptions)
-        
-        # Создаем loader
-        connector, conf_params = get_storage()
-        storage_opts = connector.opts().parse_params(conf_params, args)
-        
-        with connector.storage()(storage_opts) as storage:
-            loader = Loader(storage, args=args)
-            
-            if not loader.devices:
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"No devices found for query: {query.query}"
-                )
-            
-            # Выполняем patch
-            success, fail = api.patch(args, loader)
-            
-            # Формируем результат
-            results = []
-            for device_id, items in success.items():
-                device = loader.get_device(device_id)
-                for item in items:
-                    results.append(GenerationResult(
-                        device=device.hostname,
-                        content=item[1],
-                        success=True
-                    ))
-            
-            # Добавляем ошибки
-            for device_id, error in fail.items():
-                device = loader.get_device(device_id)
-                results.append(GenerationResult(
-                    device=device.hostname,
-                    content="",
-                    success=False,
-                    error=str(error)
-                ))
-            
-            return ApiResponse(
-                success=True,
-                message=f"Generated patch for {len(success)} devices",
-                data=results
-            )
-            
+        job.result = await asyncio.wrap_future(future)
+        job.status = "done"
+    except asyncio.CancelledError:
+        job.status = "cancelled"
+    except ApiError as e:
+        job.status = "failed"
+        job.error = str(e.detail)
+    except BrokenProcessPool:
+        _restart_pool(pool)
+        job.status = "failed"
+        job.error = _POOL_BROKEN_DETAIL
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        job.status = "failed"
+        job.error = _error_detail(e)
+    finally:
+        _deploy_futures.pop(job_id, None)
+        _deploy_finished[job_id] = time.monotonic()
+        _prune_deploy_jobs()
+
+
+def _prune_deploy_jobs():
+    """Удалить результаты завершенных задач deploy старше _DEPLOY_JOB_TTL и сверх _DEPLOY_JOBS_MAX"""
+    deadline = time.monotonic() - _DEPLOY_JOB_TTL
+    while _deploy_finished:
+        job_id, finished = next(iter(_deploy_finished.items()))
+        if finished > deadline and len(_deploy_finished) <= _DEPLOY_JOBS_MAX:
+            break
+        del _deploy_finished[job_id]
+        _deploy_jobs.pop(job_id, None)
 
 
 @app.post("/api/v1/deploy", response_model=ApiResponse)
 async def deploy_config(query: DeviceQuery, options: DeployOptions):
     """
     Деплой конфигурации на устройства (аналог команды 'ann deploy')
+
+    Деплой выполняется в фоне, статус доступен по GET /api/v1/deploy/{job_id},
+    отменить еще не начавшийся деплой можно через DELETE /api/v1/deploy/{job_id}
     """
-    try:
-        # Создаем аргументы CLI
-        args = _create_cli_args(query, options, cli_args.DeployOptions)
-        
-        # Создаем loader
-        connector, conf_params = get_storage()
-        storage_opts = connector.opts().parse_params(conf_params, args)
-        
-        with connector.storage()(storage_opts) as storage:
-            loader = Loader(storage, args=args)
-            
-            if not loader.devices:
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"No devices found for query: {query.query}"
-                )
-            
-            # Создаем необходимые объекты для деплоя
-            deployer = Deployer(args)
-            filterer = filtering.filterer_connector.get()
-            fetcher = get_fetcher()
-            deploy_driver = get_deployer()
-            
-            # Выполняем деплой
-            exit_code = api.deploy(
-                args=args,
-                loader=loader,
-                deployer=deployer,
-                deploy_driver=deploy_driver,
-                filterer=filterer,
-                fetcher=fetcher,
-            )
-            
-            # Формируем результат
-            results = []
-            for hostname, result in deployer.deploy_cmds.items():
-                if isinstance(result, Exception):
-                    results.append(DeployResult(
-                        device=hostname,
-                        success=False,
-                        duration=0.0,
-                        error=str(result)
-                    ))
-                else:
-                    results.append(DeployResult(
-                        device=hostname,
-                        success=True,
-                        duration=0.0  # TODO: получить реальное время
-                    ))
-            
-            # Добавляем ошибки из failed_configs
-            for hostname, error in deployer.failed_configs.items():
-                results.append(DeployResult(
-                    device=hostname,
-                    success=False,
-                    duration=0.0,
-                    error=str(error)
-                ))
-            
-            return ApiResponse(
-                success=exit_code == 0,
-                message=f"Deploy completed with exit code {exit_code}",
-                data=results
-            )
-            
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    job_id = uuid.uuid4().hex
+    pool = _pool
+    future = _submit(_run_deploy, query, options)
+    _deploy_jobs[job_id] = DeployJob(job_id=job_id, status="running")
+    _deploy_futures[job_id] = future
+    task = asyncio.create_task(_deploy_job(job_id, future, pool))
+    _deploy_tasks.add(task)
+    task.add_done_callback(_deploy_tasks.discard)
+    return ApiResponse(
+        success=True,
+        message=f"Deploy started with job id {job_id}",
+        data={"job_id": job_id}
+    )
+
+
+@app.get("/api/v1/deploy/{job_id}", response_model=ApiResponse)
+async def deploy_status(job_id: str):
+    """
+    Получить статус фонового deploy
+    """
+    _prune_deploy_jobs()
+    job = _deploy_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown deploy job: {job_id}")
+    return ApiResponse(
+        success=job.status != "failed",
+        message=f"Deploy job {job_id} is {job.status}",
+        data=job
+    )
+
+
+@app.delete("/api/v1/deploy/{job_id}", response_model=ApiResponse)
+async def cancel_deploy(job_id: str):
+    """
+    Отменить фоновый deploy. Отменить можно только задачу, которая еще ждет
+    свободного процесса в пуле: начавшийся deploy доводится до конца
+    """
+    job = _deploy_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown deploy job: {job_id}")
+    future = _deploy_futures.get(job_id)
+    if future is None or not future.cancel():
+        raise HTTPException(status_code=409, detail=f"Deploy job {job_id} is already started and cannot be cancelled")
+    job.status = "cancelled"
+    return ApiResponse(
+        success=True,
+        message=f"Deploy job {job_id} is cancelled",
+        data=job
+    )
+
+
+_DEVICE_FIELDS = operator.attrgetter("id", "hostname", "fqdn")
+_DEVICE_COLUMNS = ("id", "hostname", "fqdn", "vendor", "breed")
+
+
+def _device_columns(devices) -> Dict[str, list]:
+    """Собрать поля устройств по столбцам за один проход"""
+    if not devices:
+        return {name: [] for name in _DEVICE_COLUMNS}
+    ids, hostnames, fqdns = zip(*map(_DEVICE_FIELDS, devices))
+    return {
+        "id": list(ids),
+        "hostname": list(hostnames),
+        "fqdn": list(fqdns),
+        "vendor": [getattr(device.hw, "vendor", "unknown") for device in devices],
+        "breed": [getattr(device, "breed", "unknown") for device in devices],
+    }
+
+
+def _device_row(device) -> Dict[str, Any]:
+    """Поля одного устройства"""
+    device_id, hostname, fqdn = _DEVICE_FIELDS(device)
+    return {
+        "id": device_id,
+        "hostname": hostname,
+        "fqdn": fqdn,
+        "vendor": getattr(device.hw, "vendor", "unknown"),
+        "breed": getattr(device, "breed", "unknown"),
+    }
+
+
+def _run_devices(device_query: DeviceQuery, data_format: str) -> ApiResponse:
+    """Список устройств, выполняется в пуле процессов, где живет кеш устройств"""
+    options = GenerationOptions()
+    args = _create_cli_args(device_query, options, cli_args.QueryOptions)
+
+    # Создаем loader
+    with _open_loader(device_query, args) as loader:
+        devices = loader.devices
+
+    if data_format == "columnar":
+        devices_info = _device_columns(devices)
+    else:
+        devices_info = [_device_row(device) for device in devices]
+
+    return ApiResponse(
+        success=True,
+        message=f"Found {len(devices)} devices",
+        data=devices_info
+    )
 
 
 @app.get("/api/v1/devices", response_model=ApiResponse)
 async def list_devices(
     query: List[str] = QueryParam(..., description="Device query"),
-    hosts_range: Optional[str] = QueryParam(None, description="Hosts range")
+    hosts_range: Optional[str] = QueryParam(None, description="Hosts range"),
+    data_format: Literal["rows", "columnar"] = QueryParam(
+        "rows", alias="format", description="Формат данных: список объектов или словарь столбцов"
+    ),
 ):
     """
     Получить список устройств по запросу
     """
-    try:
-        # Создаем объект запроса
-        device_query = DeviceQuery(query=query, hosts_range=hosts_range)
-        options = GenerationOptions()
-        args = _create_cli_args(device_query, options, cli_args.QueryOptions)
-        
-        # Создаем loader
-        connector, conf_params = get_storage()
-        storage_opts = connector.opts().parse_params(conf_params, args)
-        
-        with connector.storage()(storage_opts) as storage:
-            loader = Loader(storage, args=args)
-            
-            devices_info = []
-            for device in loader.devices:
-                devices_info.append({
-                    "id": device.id,
-                    "hostname": device.hostname,
-                    "fqdn": device.fqdn,
-                    "vendor": device.hw.vendor if hasattr(device.hw, 'vendor') else 'unknown',
-                    "breed": getattr(device, 'breed', 'unknown')
-                })
-            
-            return ApiResponse(
-                success=True,
-                message=f"Found {len(devices_info)} devices",
-                data=devices_info
-            )
-            
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    device_query = DeviceQuery(query=query, hosts_range=hosts_range)
+    return await _run_in_pool(_run_devices, device_query, data_format)
 
 
 if __name__ == "__main__":
@@ -19,10 +19,51 @@ __all__ = [
     "OrLonger",
 ]
 
-from .action import Action, ActionType, SingleAction
-from .condition import AndCondition, Condition, ConditionOperator, SingleCondition
-from .match_builder import R, MatchField, PrefixMatchValue, OrLonger
-from .policy import RoutingPolicyStatement, RoutingPolicy
-from .result import ResultType
-from .routemap import RouteMap, Route
-from .statement_builder import ThenField, CommunityActionValue
+import importlib
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .action import Action, ActionType, SingleAction
+    from .condition import AndCondition, Condition, ConditionOperator, SingleCondition
+    from .match_builder import R, MatchField, PrefixMatchValue, OrLonger
+    from .policy import RoutingPolicyStatement, RoutingPolicy
+    from .result import ResultType
+    from .routemap import RouteMap, Route
+    from .statement_builder import ThenField, CommunityActionValue
+
+# подмодули импортируются при первом обращении к имени (PEP 562),
+# чтобы `import annet.rpl` не тянул за собой весь RPL
+_SUBMODULE_MAP = {
+    "Action": "action",
+    "ActionType": "action",
+    "SingleAction": "action",
+    "AndCondition": "condition",
+    "Condition": "condition",
+    "ConditionOperator": "condition",
+    "SingleCondition": "condition",
+    "R": "match_builder",
+    "MatchField": "match_builder",
+    "PrefixMatchValue": "match_builder",
+    "OrLonger": "match_builder",
+    "RoutingPolicyStatement": "policy",
+    "RoutingPolicy": "policy",
+    "ResultType": "result",
+    "RouteMap": "routemap",
+    "Route": "routemap",
+    "ThenField": "statement_builder",
+    "CommunityActionValue": "statement_builder",
+}
+
+
+def __getattr__(name: str) -> Any:
+    try:
+        submodule = _SUBMODULE_MAP[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = getattr(importlib.import_module(f".{submodule}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
@@ -4,45 +4,175 @@
 Демонстрирует основные операции через HTTP API
 """
 
-import requests
+import argparse
+import functools
 import json
 import sys
-import argparse
-from typing import List, Dict, Any, Optional
+import time
+from urllib.parse import urlsplit
+from typing import TYPE_CHECKING, ClassVar, Iterator, List, Dict, Any, Optional, Tuple
+
+# requests, httpx и asyncio импортируются при создании клиента,
+# чтобы --help и разбор аргументов не платили за их импорт
+if TYPE_CHECKING:
+    import requests
+    from requests.adapters import HTTPAdapter
+
+try:
+    import orjson
+except ImportError:  # без orjson используется стандартный json
+    orjson = None
+
+
+def _json_loads(content: bytes) -> Any:
+    """Разобрать JSON ответа, через orjson если он установлен"""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def _json_dumps(obj: Any) -> bytes:
+    """Закодировать тело запроса в JSON, через orjson если он установлен"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode()
+
+
+def _json_pretty(obj: Any) -> str:
+    """JSON с отступами для вывода, через orjson если он установлен"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(obj, indent=2, ensure_ascii=False)
+
+
+def _iter_ndjson_rows(response: "requests.Response", lines: Iterator[bytes]) -> Iterator[Any]:
+    """Элементы data из строк NDJSON, соединение закрывается и при досрочном прекращении итерации"""
+    try:
+        for line in lines:
+            if line:
+                yield _json_loads(line)
+    finally:
+        response.close()
+
+
+def _command_body(query: List[str], options: Dict[str, Any]) -> Dict[str, Any]:
+    """Тело запроса команды: запрос устройств и опции передаются отдельными объектами"""
+    return {'query': {'query': query}, 'options': options}
+
+
+def _merge_queries(queries: List[List[str]]) -> List[str]:
+    """Объединить несколько запросов в один без повторов, сохраняя порядок"""
+    return list(dict.fromkeys(q for query in queries for q in query))
 
 
 class AnnetApiClient:
     """Клиент для работы с Annet REST API"""
     
-    def __init__(self, base_url: str = "http://localhost:8000"):
+    # scheme://host -> HTTPAdapter, общий для всех экземпляров клиента
+    _adapter_cache: ClassVar[Dict[str, "HTTPAdapter"]] = {}
+    
+    def __init__(self, base_url: str = "http://localhost:8000", cache_ttl: float = 60.0):
         self.base_url = base_url.rstrip('/')
+        # кеш идемпотентных GET: ключ -> (время истечения, ответ)
+        self.cache_ttl = cache_ttl
+        self._cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        import requests
+        from urllib3.util.request import ACCEPT_ENCODING
+        self._requests = requests
         self.session = requests.Session()
+        # адаптер с пулом соединений общий для всех клиентов одного хоста
+        scheme, netloc = urlsplit(self.base_url)[:2]
+        origin = f"{scheme}://{netloc}"
+        self.session.mount(origin, self._get_adapter(origin))
         self.session.headers.update({
             'Content-Type': 'application/json',
-            'Accept': 'application/json'
+            'Accept': 'application/json',
+            # gzip/deflate, а также br и zstd, если установлены brotli и zstandard
+            'Accept-Encoding': ACCEPT_ENCODING,
         })
     
-    def _make_request(self, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
+    @classmethod
+    def _get_adapter(cls, origin: str) -> "HTTPAdapter":
+        """Адаптер для scheme://host, создается при первом обращении"""
+        adapter = cls._adapter_cache.get(origin)
+        if adapter is None:
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+            # пул keep-alive соединений и повтор идемпотентных запросов при 502/503/504
+            adapter = cls._adapter_cache[origin] = HTTPAdapter(
+                pool_connections=32,
+                pool_maxsize=64,
+                max_retries=Retry(
+                    total=3,
+                    backoff_factor=0.2,
+                    status_forcelist=[502, 503, 504],
+                    raise_on_status=False,
+                ),
+            )
+        return adapter
+    
+    def _send(self, method: str, endpoint: str, **kwargs) -> "requests.Response":
         """Выполнить HTTP запрос к API"""
         url = f"{self.base_url}{endpoint}"
         
         try:
             response = self.session.request(method, url, **kwargs)
             response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
+            return response
+        except self._requests.exceptions.RequestException as e:
             print(f"Ошибка запроса: {e}")
-            if hasattr(e, 'response') and e.response is not None:
+            error_response = getattr(e, 'response', None)
+            if error_response is not None:
+                # json.JSONDecodeError и orjson.JSONDecodeError - подклассы ValueError
                 try:
-                    error_detail = e.response.json()
+                    error_detail = _json_loads(error_response.content)
                     print(f"Детали ошибки: {error_detail}")
-                except:
-                    print(f"Ответ сервера: {e.response.text}")
+                except ValueError:
+                    print(f"Ответ сервера: {error_response.text}")
             sys.exit(1)
     
+    def _make_request(self, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
+        """Выполнить HTTP запрос к API и разобрать JSON ответа"""
+        return _json_loads(self._send(method, endpoint, **kwargs).content)
+    
+    def _post_json(self, endpoint: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        """POST с телом, заранее закодированным в JSON"""
+        return self._make_request('POST', endpoint, data=_json_dumps(body))
+    
+    def _cached_get(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """GET с кешем на cache_ttl секунд, cache_ttl=0 отключает кеш"""
+        key = endpoint + "&".join(f"{k}:{v}" for k, v in sorted((params or {}).items()))
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        
+        result = self._make_request('GET', endpoint, params=params)
+        if self.cache_ttl > 0:
+            self._cache[key] = (time.monotonic() + self.cache_ttl, result)
+        return result
+    
+    def _stream_request(self, endpoint: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        POST с ответом в формате NDJSON (?stream=true): первая строка - ответ без data,
+        data - итератор по остальным строкам, разбираемым по мере получения
+        """
+        response = self._send('POST', endpoint, params={'stream': 'true'}, data=_json_dumps(body), stream=True)
+        lines = response.iter_lines()
+        first = next((line for line in lines if line), None)
+        if first is None:
+            response.close()
+            raise ValueError(f"Пустой потоковый ответ сервера на {endpoint}")
+        result = _json_loads(first)
+        result['data'] = _iter_ndjson_rows(response, lines)
+        return result
+    
+    def clear_cache(self) -> None:
+        """Сбросить кеш GET запросов"""
+        self._cache.clear()
+    
     def health_check(self) -> Dict[str, Any]:
         """Проверить здоровье API"""
-        return self._make_request('GET', '/health')
+        return self._cached_get('/health')
     
     def get_devices(self, query: List[str], hosts_range: Optional[str] = None) -> Dict[str, Any]:
         """Получить список устройств"""
@@ -50,59 +180,282 @@ class AnnetApiClient:
         if hosts_range:
             params['hosts_range'] = hosts_range
         
-        return self._make_request('GET', '/api/v1/devices', params=params)
+        return self._cached_get('/api/v1/devices', params=params)
     
-    def generate_config(self, query: List[str], **options) -> Dict[str, Any]:
+    def generate_config(self, query: List[str], stream: bool = False, **options) -> Dict[str, Any]:
         """Сгенерировать конфигурацию"""
-        data = {'query': query, **options}
-        return self._make_request('POST', '/api/v1/gen', json=data)
+        data = _command_body(query, options)
+        if stream:
+            return self._stream_request('/api/v1/gen', data)
+        return self._post_json('/api/v1/gen', data)
     
-    def show_diff(self, query: List[str], **options) -> Dict[str, Any]:
+    def show_diff(self, query: List[str], stream: bool = False, **options) -> Dict[str, Any]:
         """Показать diff конфигурации"""
-        data = {'query': query, **options}
-        return self._make_request('POST', '/api/v1/diff', json=data)
+        data = _command_body(query, options)
+        if stream:
+            return self._stream_request('/api/v1/diff', data)
+        return self._post_json('/api/v1/diff', data)
     
-    def generate_patch(self, query: List[str], **options) -> Dict[str, Any]:
+    def generate_patch(self, query: List[str], stream: bool = False, **options) -> Dict[str, Any]:
         """Сгенерировать патч"""
-        data = {'query': query, **options}
-        return self._make_request('POST', '/api/v1/patch', json=data)
+        data = _command_body(query, options)
+        if stream:
+            return self._stream_request('/api/v1/patch', data)
+        return self._post_json('/api/v1/patch', data)
+    
+    def generate_config_batch(self, queries: List[List[str]], **options) -> Dict[str, Any]:
+        """Сгенерировать конфигурацию для нескольких запросов одним POST"""
+        return self.generate_config(_merge_queries(queries), **options)
+    
+    def show_diff_batch(self, queries: List[List[str]], **options) -> Dict[str, Any]:
+        """Показать diff для нескольких запросов одним POST"""
+        return self.show_diff(_merge_queries(queries), **options)
+    
+    def generate_patch_batch(self, queries: List[List[str]], **options) -> Dict[str, Any]:
+        """Сгенерировать патчи для нескольких запросов одним POST"""
+        return self.generate_patch(_merge_queries(queries), **options)
     
     def deploy_config(self, query: List[str], **options) -> Dict[str, Any]:
         """Деплой конфигурации"""
-        data = {'query': query, **options}
-        return self._make_request('POST', '/api/v1/deploy', json=data)
+        data = _command_body(query, options)
+        return self._post_json('/api/v1/deploy', data)
+
+    def deploy_status(self, job_id: str) -> Dict[str, Any]:
+        """Получить статус фонового деплоя"""
+        return self._make_request('GET', f'/api/v1/deploy/{job_id}')
+
+    def wait_deploy(self, job_id: str, interval: float = 2.0) -> Dict[str, Any]:
+        """Дождаться завершения фонового деплоя, опрашивая его статус раз в interval секунд"""
+        while True:
+            response = self.deploy_status(job_id)
+            if response['data']['status'] != 'running':
+                return response
+            time.sleep(interval)
+
+
+class AsyncAnnetApiClient:
+    """Асинхронный клиент для Annet REST API, позволяет выполнять запросы параллельно"""
+    
+    def __init__(self, base_url: str = "http://localhost:8000", max_connections: int = 64):
+        try:
+            import httpx
+        except ImportError:
+            raise RuntimeError("httpx is required for AsyncAnnetApiClient: pip install httpx") from None
+        self._httpx = httpx
+        self.base_url = base_url.rstrip('/')
+        # keep-alive соединения переиспользуются между параллельными запросами
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={
+                'Content-Type': 'application/json',
+                'Accept': 'application/json'
+            },
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=max_connections),
+            timeout=None,
+        )
+    
+    async def __aenter__(self) -> "AsyncAnnetApiClient":
+        return self
+    
+    async def __aexit__(self, *exc_info) -> None:
+        await self.client.aclose()
+    
+    async def _make_request(self, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
+        """
+        Выполнить HTTP запрос к API. В отличие от синхронного клиента ошибка
+        пробрасывается дальше, чтобы не завершать процесс из параллельной задачи
+        """
+        try:
+            response = await self.client.request(method, endpoint, **kwargs)
+            response.raise_for_status()
+            return _json_loads(response.content)
+        except self._httpx.HTTPError as e:
+            print(f"Ошибка запроса: {e}")
+            if isinstance(e, self._httpx.HTTPStatusError):
+                try:
+                    error_detail = e.response.json()
+                    print(f"Детали ошибки: {error_detail}")
+                except ValueError:
+                    print(f"Ответ сервера: {e.response.text}")
+            raise
+    
+    async def generate_config(self, query: List[str], **options) -> Dict[str, Any]:
+        """Сгенерировать конфигурацию"""
+        data = _command_body(query, options)
+        return await self._make_request('POST', '/api/v1/gen', content=_json_dumps(data))
+    
+    async def show_diff(self, query: List[str], **options) -> Dict[str, Any]:
+        """Показать diff конфигурации"""
+        data = _command_body(query, options)
+        return await self._make_request('POST', '/api/v1/diff', content=_json_dumps(data))
+    
+    async def generate_patch(self, query: List[str], **options) -> Dict[str, Any]:
+        """Сгенерировать патч"""
+        data = _command_body(query, options)
+        return await self._make_request('POST', '/api/v1/patch', content=_json_dumps(data))
+    
+    async def gen_many(self, queries: List[List[str]], **options) -> List[Dict[str, Any]]:
+        """Сгенерировать конфигурацию для нескольких запросов параллельно"""
+        import asyncio
+        return await asyncio.gather(*(self.generate_config(q, **options) for q in queries))
+    
+    async def diff_many(self, queries: List[List[str]], **options) -> List[Dict[str, Any]]:
+        """Показать diff для нескольких запросов параллельно"""
+        import asyncio
+        return await asyncio.gather(*(self.show_diff(q, **options) for q in queries))
+    
+    async def patch_many(self, queries: List[List[str]], **options) -> List[Dict[str, Any]]:
+        """Сгенерировать патчи для нескольких запросов параллельно"""
+        import asyncio
+        return await asyncio.gather(*(self.generate_patch(q, **options) for q in queries))
+
+
+async def _run_many(base_url: str, method: str, queries: List[List[str]], options: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Выполнить команду параллельно для каждого запроса"""
+    async with AsyncAnnetApiClient(base_url) as client:
+        return await getattr(client, method)(queries, **options)
 
 
 def print_response(response: Dict[str, Any], title: str = "Ответ"):
-    """Красиво вывести ответ API"""
-    print(f"\n=== {title} ===")
-    print(f"Успех: {response.get('success', 'N/A')}")
-    print(f"Сообщение: {response.get('message', 'N/A')}")
+    """Красиво вывести ответ API, собирая вывод в буфер и записывая его одним вызовом"""
+    parts = [
+        f"\n=== {title} ===",
+        f"Успех: {response.get('success', 'N/A')}",
+        f"Сообщение: {response.get('message', 'N/A')}",
+    ]
     
     if response.get('errors'):
-        print("Ошибки:")
-        for error in response['errors']:
-            print(f"  - {error}")
+        parts.append("Ошибки:")
+        parts.extend(f"  - {error}" for error in response['errors'])
+    
+    data = response.get('data')
+    if not data:
+        # Ответ без данных (например, health) выводим сразу одной записью
+        sys.stdout.write("\n".join(parts) + "\n")
+        return
     
-    if response.get('data'):
-        print("Данные:")
-        if isinstance(response['data'], list):
-            for i, item in enumerate(response['data']):
-                print(f"  [{i+1}] {json.dumps(item, indent=2, ensure_ascii=False)}")
-        else:
-            print(f"  {json.dumps(response['data'], indent=2, ensure_ascii=False)}")
+    if isinstance(data, Iterator):
+        # Потоковый ответ: заголовок выводим сразу, элементы - по мере получения
+        sys.stdout.write("\n".join(parts) + "\n")
+        for i, item in enumerate(data):
+            if not i:
+                sys.stdout.write("Данные:\n")
+            sys.stdout.write(f"  [{i+1}] {_json_pretty(item)}\n")
+        return
+    
+    parts.append("Данные:")
+    if isinstance(data, list):
+        parts.extend(f"  [{i+1}] {_json_pretty(item)}" for i, item in enumerate(data))
+    else:
+        parts.append(f"  {_json_pretty(data)}")
+    sys.stdout.write("\n".join(parts) + "\n")
 
 
-def main():
+# Опции подкоманд, передаваемые в API, если они заданы
+COMMAND_OPT_KEYS: Dict[str, Tuple[str, ...]] = {
+    'gen': ('allowed_gens', 'no_acl', 'annotate'),
+    'diff': ('show_rules', 'no_collapse'),
+    'patch': ('add_comments',),
+    'deploy': ('dont_commit', 'rollback'),
+}
+
+# Команда -> (метод AnnetApiClient, метод AsyncAnnetApiClient для --split-query, заголовок вывода)
+COMMAND_METHODS: Dict[str, Tuple[str, str, str]] = {
+    'gen': ('generate_config', 'gen_many', "Генерация конфигурации"),
+    'diff': ('show_diff', 'diff_many', "Diff конфигурации"),
+    'patch': ('generate_patch', 'patch_many', "Патч конфигурации"),
+}
+
+
+def build_opts(args: argparse.Namespace, command: str) -> Dict[str, Any]:
+    """Собрать опции команды: общие опции и заданные опции подкоманды"""
+    options = {
+        'config': args.config,
+        'parallel': args.parallel
+    }
+    options.update({k: getattr(args, k) for k in COMMAND_OPT_KEYS[command] if getattr(args, k, None)})
+    return options
+
+
+def _do_health(client: AnnetApiClient, args: argparse.Namespace):
+    response = client.health_check()
+    print_response(response, "Health Check")
+
+
+def _do_devices(client: AnnetApiClient, args: argparse.Namespace):
+    response = client.get_devices(
+        query=args.query,
+        hosts_range=args.hosts_range
+    )
+    print_response(response, "Устройства")
+
+
+def _do_command(client: AnnetApiClient, args: argparse.Namespace):
+    """gen/diff/patch: один запрос или, с --split-query, параллельные запросы по каждому query"""
+    method, many_method, title = COMMAND_METHODS[args.command]
+    options = build_opts(args, args.command)
+    
+    if args.split_query:
+        import asyncio
+        responses = asyncio.run(_run_many(args.url, many_method, [[q] for q in args.query], options))
+        for query, response in zip(args.query, responses):
+            print_response(response, f"{title}: {query}")
+    else:
+        response = getattr(client, method)(query=args.query, stream=args.stream, **options)
+        print_response(response, title)
+
+
+def _do_deploy(client: AnnetApiClient, args: argparse.Namespace):
+    options = build_opts(args, 'deploy')
+    options['no_ask_deploy'] = True  # Всегда True для API
+    
+    print("⚠️  ВНИМАНИЕ: Выполняется деплой конфигурации!")
+    confirm = input("Продолжить? (yes/no): ")
+    if confirm.lower() not in ['yes', 'y']:
+        print("Деплой отменен.")
+        sys.exit(0)
+    
+    response = client.deploy_config(query=args.query, **options)
+    print_response(response, "Деплой конфигурации")
+    if args.wait:
+        print_response(client.wait_deploy(response['data']['job_id']), "Статус деплоя")
+
+
+def _do_deploy_status(client: AnnetApiClient, args: argparse.Namespace):
+    response = client.wait_deploy(args.job_id) if args.wait else client.deploy_status(args.job_id)
+    print_response(response, "Статус деплоя")
+
+
+# Команда -> обработчик
+COMMAND_HANDLERS = {
+    'health': _do_health,
+    'devices': _do_devices,
+    'gen': _do_command,
+    'diff': _do_command,
+    'patch': _do_command,
+    'deploy': _do_deploy,
+    'deploy-status': _do_deploy_status,
+}
+
+
+@functools.cache
+def build_parser() -> argparse.ArgumentParser:
+    """Парсер аргументов командной строки, создается один раз"""
     parser = argparse.ArgumentParser(description="Annet REST API Client")
     parser.add_argument('--url', default='http://localhost:8000', 
                        help='Base URL of Annet API server')
-    parser.add_argument('--query', nargs='+', required=True,
+    parser.add_argument('--query', nargs='+', default=[],
                        help='Device query')
+    parser.add_argument('--batch-file', type=argparse.FileType('r'),
+                       help='File with additional device queries, one per line')
     parser.add_argument('--config', default='running',
                        help='Config source (running, empty, file path)')
     parser.add_argument('--parallel', type=int, default=1,
                        help='Number of parallel processes')
+    parser.add_argument('--stream', action='store_true',
+                       help='Receive gen/diff/patch results as NDJSON and print them as they arrive')
+    parser.add_argument('--split-query', action='store_true',
+                       help='Send a separate parallel request per query item (gen/diff/patch, requires httpx)')
     
     subparsers = parser.add_subparsers(dest='command', help='Available commands')
     
@@ -132,86 +485,34 @@ def main():
     deploy_parser = subparsers.add_parser('deploy', help='Deploy configuration')
     deploy_parser.add_argument('--dont-commit', action='store_true', help='Do not commit')
     deploy_parser.add_argument('--rollback', action='store_true', help='Enable rollback')
+    deploy_parser.add_argument('--wait', action='store_true', help='Wait for the deploy job to finish')
     
+    # Deploy status
+    deploy_status_parser = subparsers.add_parser('deploy-status', help='Show deploy job status')
+    deploy_status_parser.add_argument('job_id', help='Deploy job id')
+    deploy_status_parser.add_argument('--wait', action='store_true', help='Wait for the deploy job to finish')
+    return parser
+
+
+def main():
+    parser = build_parser()
     args = parser.parse_args()
     
     if not args.command:
         parser.print_help()
         sys.exit(1)
     
+    if args.batch_file:
+        with args.batch_file:
+            args.query = _merge_queries([args.query, [line.strip() for line in args.batch_file if line.strip()]])
+    if not args.query and args.command != 'deploy-status':
+        parser.error("at least one query is required: use --query or --batch-file")
+    
     # Создаем клиент
     client = AnnetApiClient(args.url)
     
     try:
-        if args.command == 'health':
-            response = client.health_check()
-            print_response(response, "Health Check")
-        
-        elif args.command == 'devices':
-            response = client.get_devices(
-                query=args.query,
-                hosts_range=getattr(args, 'hosts_range', None)
-            )
-            print_response(response, "Устройства")
-        
-        elif args.command == 'gen':
-            options = {
-                'config': args.config,
-                'parallel': args.parallel
-            }
-            if hasattr(args, 'allowed_gens') and args.allowed_gens:
-                options['allowed_gens'] = args.allowed_gens
-            if hasattr(args, 'no_acl') and args.no_acl:
-                options['no_acl'] = True
-            if hasattr(args, 'annotate') and args.annotate:
-                options['annotate'] = True
-            
-            response = client.generate_config(query=args.query, **options)
-            print_response(response, "Генерация конфигурации")
-        
-        elif args.command == 'diff':
-            options = {
-                'config': args.config,
-                'parallel': args.parallel
-            }
-            if hasattr(args, 'show_rules') and args.show_rules:
-                options['show_rules'] = True
-            if hasattr(args, 'no_collapse') and args.no_collapse:
-                options['no_collapse'] = True
-            
-            response = client.show_diff(query=args.query, **options)
-            print_response(response, "Diff конфигурации")
-        
-        elif args.command == 'patch':
-            options = {
-                'config': args.config,
-                'parallel': args.parallel
-            }
-            if hasattr(args, 'add_comments') and args.add_comments:
-                options['add_comments'] = True
-            
-            response = client.generate_patch(query=args.query, **options)
-            print_response(response, "Патч конфигурации")
-        
-        elif args.command == 'deploy':
-            options = {
-                'config': args.config,
-                'parallel': args.parallel,
-                'no_ask_deploy': True  # Всегда True для API
-            }
-            if hasattr(args, 'dont_commit') and args.dont_commit:
-                options['dont_commit'] = True
-            if hasattr(args, 'rollback') and args.rollback:
-                options['rollback'] = True
-            
-            print("⚠️  ВНИМАНИЕ: Выполняется деплой конфигурации!")
-            confirm = input("Продолжить? (yes/no): ")
-            if confirm.lower() not in ['yes', 'y']:
-                print("Деплой отменен.")
-                sys.exit(0)
-            
-            response = client.deploy_config(query=args.query, **options)
-            print_response(response, "Деплой конфигурации")
+        COMMAND_HANDLERS[args.command](client, args)
     
     except KeyboardInterrupt:
         print("\nОперация прервана пользователем.")
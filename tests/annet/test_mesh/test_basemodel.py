@@ -57,6 +57,26 @@ def test_merge_model():
     assert merger("x", A(x=1, y=1), A(x=2, y=2)) == A(x=2, y=1)
 
 
+def test_merge_model_visits_set_fields():
+    calls = []
+
+    class Tracking(UseLast):
+        def _merge(self, name, x, y):
+            calls.append(name)
+            return super()._merge(name, x, y)
+
+    class A(BaseMeshModel):
+        x: Annotated[int, Tracking()]
+        y: Annotated[int, Tracking()]
+        z: Annotated[int, Tracking()]
+
+        def __eq__(self, other):
+            return vars(self) == vars(other)
+
+    assert merge(A(x=1), A(x=2, y=3)) == A(x=2, y=3)
+    assert calls == ["x"]
+
+
 def test_merge_model_default():
     class A(BaseMeshModel):
         x: int
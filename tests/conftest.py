@@ -0,0 +1,5 @@
+def pytest_addoption(parser):
+    parser.addoption(
+        "--integration", action="store_true", default=False,
+        help="run REST API tests against a server started in a subprocess",
+    )
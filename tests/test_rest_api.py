@@ -5,66 +5,95 @@
 
 import pytest
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import time
 import subprocess
 import sys
 import os
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 
-class TestAnnetRestApi:
-    """Тесты для REST API"""
+def _start_api_server(session: requests.Session, base_url: str) -> Optional[subprocess.Popen]:
+    """Запустить API сервер в отдельном процессе, если он еще не запущен"""
+    # Проверяем, запущен ли уже сервер
+    try:
+        response = session.get(f"{base_url}/health", timeout=2)
+        if response.status_code == 200:
+            print("API сервер уже запущен")
+            return None
+    except requests.exceptions.RequestException:
+        pass
     
-    @classmethod
-    def setup_class(cls):
-        """Настройка перед запуском тестов"""
-        cls.base_url = "http://localhost:8000"
-        cls.api_process = None
-        
-        # Проверяем, запущен ли уже сервер
+    # Запускаем API сервер для тестов
+    print("Запуск API сервера для тестов...")
+    api_process = subprocess.Popen([
+        sys.executable, "-m", "annet.rest_api",
+        "--host", "127.0.0.1",
+        "--port", "8000",
+        "--log-level", "ERROR"
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    
+    # Ждем запуска сервера, увеличивая паузу между попытками от 50 мс до 1 с
+    deadline = time.monotonic() + 30  # 30 секунд максимум
+    attempt = 0
+    while time.monotonic() < deadline:
         try:
-            response = requests.get(f"{cls.base_url}/health", timeout=2)
+            response = session.get(f"{base_url}/health", timeout=0.2)
             if response.status_code == 200:
-                print("API сервер уже запущен")
-                return
+                print("API сервер запущен")
+                return api_process
         except requests.exceptions.RequestException:
             pass
+        time.sleep(min(0.05 * 2 ** attempt, 1.0))
+        attempt += 1
+    
+    api_process.terminate()
+    pytest.fail("Не удалось запустить API сервер")
+
+
+@pytest.fixture(scope="module")
+def rest_api():
+    """Модуль annet.rest_api, без зависимостей REST API тесты пропускаются"""
+    return pytest.importorskip("annet.rest_api")
+
+
+class TestAnnetRestApi:
+    """Тесты для REST API"""
+    
+    @pytest.fixture(scope="class", autouse=True)
+    def api(self, request, rest_api):
+        """
+        По умолчанию приложение тестируется в процессе через TestClient,
+        с --integration - настоящий сервер, запущенный в отдельном процессе
+        """
+        cls = request.cls
+        if not request.config.getoption("--integration"):
+            from fastapi.testclient import TestClient
+            
+            with TestClient(rest_api.app) as client:
+                cls.base_url = str(client.base_url)
+                cls.session = client
+                yield
+            return
         
-        # Запускаем API сервер для тестов
-        print("Запуск API сервера для тестов...")
-        cls.api_process = subprocess.Popen([
-            sys.executable, "-m", "annet.rest_api",
-            "--host", "127.0.0.1",
-            "--port", "8000",
-            "--log-level", "ERROR"
-        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        
-        # Ждем запуска сервера
-        for _ in range(30):  # 30 секунд максимум
-            try:
-                response = requests.get(f"{cls.base_url}/health", timeout=1)
-                if response.status_code == 200:
-                    print("API сервер запущен")
-                    break
-            except requests.exceptions.RequestException:
-                time.sleep(1)
-        else:
-            if cls.api_process:
-                cls.api_process.terminate()
-            pytest.fail("Не удалось запустить API сервер")
-    
-    @classmethod
-    def teardown_class(cls):
-        """Очистка после тестов"""
-        if cls.api_process:
-            cls.api_process.terminate()
-            cls.api_process.wait()
+        cls.base_url = "http://localhost:8000"
+        # одна сессия на все тесты, чтобы переиспользовать keep-alive соединения
+        cls.session = requests.Session()
+        cls.session.mount("http://", HTTPAdapter(pool_maxsize=16))
+        try:
+            api_process = _start_api_server(cls.session, cls.base_url)
+            yield
+        finally:
+            cls.session.close()
+        if api_process:
+            api_process.terminate()
+            api_process.wait()
             print("API сервер остановлен")
     
     def test_health_check(self):
         """Тест проверки здоровья API"""
-        response = requests.get(f"{self.base_url}/health")
+        response = self.session.get(f"{self.base_url}/health")
         assert response.status_code == 200
         
         data = response.json()
@@ -73,7 +102,7 @@ class TestAnnetRestApi:
     
     def test_root_endpoint(self):
         """Тест корневого endpoint"""
-        response = requests.get(f"{self.base_url}/")
+        response = self.session.get(f"{self.base_url}/")
         assert response.status_code == 200
         
         data = response.json()
@@ -83,8 +112,8 @@ class TestAnnetRestApi:
     
     def test_devices_endpoint_empty_query(self):
         """Тест endpoint устройств с пустым запросом"""
-        response = requests.get(f"{self.base_url}/api/v1/devices", 
-                               params={"query": ["nonexistent"]})
+        response = self.session.get(f"{self.base_url}/api/v1/devices", 
+                                   params={"query": ["nonexistent"]})
         
         # API должен вернуть успешный ответ, даже если устройства не найдены
         assert response.status_code in [200, 404]
@@ -97,8 +126,8 @@ class TestAnnetRestApi:
             "parallel": 1
         }
         
-        response = requests.post(f"{self.base_url}/api/v1/gen", 
-                                json=data)
+        response = self.session.post(f"{self.base_url}/api/v1/gen", 
+                                    json=data)
         
         # Может вернуть 404 если устройство не найдено, или 500 при других ошибках
         assert response.status_code in [200, 404, 500]
@@ -116,8 +145,8 @@ class TestAnnetRestApi:
             "show_rules": False
         }
         
-        response = requests.post(f"{self.base_url}/api/v1/diff", 
-                                json=data)
+        response = self.session.post(f"{self.base_url}/api/v1/diff", 
+                                    json=data)
         
         assert response.status_code in [200, 404, 500]
         
@@ -134,8 +163,8 @@ class TestAnnetRestApi:
             "add_comments": False
         }
         
-        response = requests.post(f"{self.base_url}/api/v1/patch", 
-                                json=data)
+        response = self.session.post(f"{self.base_url}/api/v1/patch", 
+                                    json=data)
         
         assert response.status_code in [200, 404, 500]
         
@@ -146,9 +175,9 @@ class TestAnnetRestApi:
     
     def test_invalid_json(self):
         """Тест с невалидным JSON"""
-        response = requests.post(f"{self.base_url}/api/v1/gen",
-                                data="invalid json",
-                                headers={"Content-Type": "application/json"})
+        response = self.session.post(f"{self.base_url}/api/v1/gen",
+                                    data="invalid json",
+                                    headers={"Content-Type": "application/json"})
         
         assert response.status_code == 422  # Unprocessable Entity
     
@@ -159,8 +188,8 @@ class TestAnnetRestApi:
             # Отсутствует обязательное поле "query"
         }
         
-        response = requests.post(f"{self.base_url}/api/v1/gen", 
-                                json=data)
+        response = self.session.post(f"{self.base_url}/api/v1/gen", 
+                                    json=data)
         
         assert response.status_code == 422  # Validation Error
     
@@ -171,41 +200,551 @@ class TestAnnetRestApi:
             "config": "/nonexistent/path/to/config"
         }
         
-        response = requests.post(f"{self.base_url}/api/v1/gen", 
-                                json=data)
+        response = self.session.post(f"{self.base_url}/api/v1/gen", 
+                                    json=data)
         
         # Может вернуть ошибку валидации или внутреннюю ошибку
         assert response.status_code in [422, 500]
     
+    def test_deploy_status_unknown_job(self):
+        """Тест статуса несуществующей задачи deploy"""
+        response = self.session.get(f"{self.base_url}/api/v1/deploy/nonexistent")
+        assert response.status_code == 404
+
+    def test_cancel_deploy_unknown_job(self):
+        """Тест отмены несуществующей задачи deploy"""
+        response = self.session.delete(f"{self.base_url}/api/v1/deploy/nonexistent")
+        assert response.status_code == 404
+
     def test_swagger_docs(self):
         """Тест доступности Swagger документации"""
-        response = requests.get(f"{self.base_url}/docs")
+        response = self.session.get(f"{self.base_url}/docs")
         assert response.status_code == 200
         assert "text/html" in response.headers.get("content-type", "")
     
     def test_redoc_docs(self):
         """Тест доступности ReDoc документации"""
-        response = requests.get(f"{self.base_url}/redoc")
+        response = self.session.get(f"{self.base_url}/redoc")
         assert response.status_code == 200
         assert "text/html" in response.headers.get("content-type", "")
     
-    def test_openapi_schema(self):
-        """Тест доступности OpenAPI схемы"""
-        response = requests.get(f"{self.base_url}/openapi.json")
+    @pytest.fixture(scope="class")
+    def openapi(self, api) -> Dict[str, Any]:
+        """OpenAPI схема, загружаемая один раз на весь класс"""
+        response = self.session.get(f"{self.base_url}/openapi.json")
         assert response.status_code == 200
-        
-        schema = response.json()
-        assert "openapi" in schema
-        assert "info" in schema
-        assert "paths" in schema
+        return response.json()
+    
+    def test_openapi_schema(self, openapi):
+        """Тест доступности OpenAPI схемы"""
+        assert not {"openapi", "info", "paths"} - openapi.keys()
         
         # Проверяем наличие основных endpoint'ов
-        paths = schema["paths"]
-        assert "/api/v1/devices" in paths
-        assert "/api/v1/gen" in paths
-        assert "/api/v1/diff" in paths
-        assert "/api/v1/patch" in paths
-        assert "/api/v1/deploy" in paths
+        missing = {
+            "/api/v1/devices",
+            "/api/v1/gen",
+            "/api/v1/diff",
+            "/api/v1/patch",
+            "/api/v1/deploy",
+        } - openapi["paths"].keys()
+        assert not missing
+
+
+def test_parse_hosts_range(rest_api):
+    """Тест разбора диапазона хостов"""
+    parse = rest_api._parse_hosts_range
+
+    assert parse(None) is None
+    assert parse("") is None
+    assert parse("10") == slice(0, 10)
+    assert parse("10:20") == slice(10, 20)
+    assert parse("10:") == slice(10, None)
+    assert parse("abc") is None
+
+
+def test_device_rows_and_columns(rest_api):
+    """Тест форматов списка устройств: строки и столбцы содержат одни и те же данные"""
+    from types import SimpleNamespace
+
+    devices = [
+        SimpleNamespace(id=1, hostname="r1", fqdn="r1.lab", hw=SimpleNamespace(vendor="huawei"), breed="vrp85"),
+        SimpleNamespace(id=2, hostname="r2", fqdn="r2.lab", hw=SimpleNamespace()),
+    ]
+    rows = [rest_api._device_row(device) for device in devices]
+    columns = rest_api._device_columns(devices)
+
+    assert rows[1] == {"id": 2, "hostname": "r2", "fqdn": "r2.lab", "vendor": "unknown", "breed": "unknown"}
+    assert list(columns) == list(rest_api._DEVICE_COLUMNS)
+    assert columns["vendor"] == ["huawei", "unknown"]
+    assert [dict(zip(columns, row)) for row in zip(*columns.values())] == rows
+    assert rest_api._device_columns([]) == {name: [] for name in rest_api._DEVICE_COLUMNS}
+
+
+def test_prune_deploy_jobs(rest_api, monkeypatch):
+    """Тест удаления завершенных задач deploy по TTL и по количеству"""
+    from collections import OrderedDict
+
+    now = time.monotonic()
+    jobs = {
+        job_id: rest_api.DeployJob(job_id=job_id, status=status)
+        for job_id, status in (("old", "done"), ("a", "failed"), ("b", "done"), ("c", "cancelled"), ("run", "running"))
+    }
+    finished = OrderedDict([("old", now - 7200), ("a", now - 3), ("b", now - 2), ("c", now - 1)])
+    monkeypatch.setattr(rest_api, "_deploy_jobs", jobs)
+    monkeypatch.setattr(rest_api, "_deploy_finished", finished)
+    monkeypatch.setattr(rest_api, "_DEPLOY_JOB_TTL", 3600.0)
+    monkeypatch.setattr(rest_api, "_DEPLOY_JOBS_MAX", 2)
+
+    rest_api._prune_deploy_jobs()
+    # выполняющиеся задачи не удаляются
+    assert set(jobs) == {"b", "c", "run"}
+    assert list(finished) == ["b", "c"]
+
+
+def test_iter_ndjson(rest_api):
+    """Тест разбиения ответа на строки NDJSON"""
+
+    envelope = rest_api.ApiResponse(success=True, message="Generating", data=["ignored"])
+    rows = [
+        rest_api.GenerationResult(device="r1", content="line1\nline2", success=True),
+        rest_api.GenerationResult(device="r2", content="", success=False, error="boom"),
+    ]
+    lines = list(rest_api._iter_ndjson(envelope, rows))
+
+    assert all(line.endswith("\n") and line.count("\n") == 1 for line in lines)
+    assert json.loads(lines[0]) == {"success": True, "message": "Generating", "errors": None}
+    assert [json.loads(line) for line in lines[1:]] == [row.model_dump() for row in rows]
+
+
+def test_iter_stream(rest_api):
+    """Тест передачи строк из очереди процесса пула в потоковый ответ"""
+    import asyncio
+    import queue
+    from concurrent.futures import Future
+
+    async def collect(lines, future):
+        batch = await rest_api._next_lines(lines, future)
+        return [line async for line in rest_api._iter_stream(batch, lines, future, None)]
+
+    lines = queue.Queue()
+    for line in ("head\n", "row1\n", "row2\n", None):
+        lines.put(line)
+    future = Future()
+    future.set_result(None)
+    assert "".join(asyncio.run(collect(lines, future))) == "head\nrow1\nrow2\n"
+
+    # ошибка после первой строки передается последней строкой
+    lines = queue.Queue()
+    for line in ("head\n", None):
+        lines.put(line)
+    future = Future()
+    future.set_exception(rest_api.ApiError(500, "boom"))
+    chunks = asyncio.run(collect(lines, future))
+    assert chunks[0] == "head\n"
+    assert json.loads(chunks[-1])["success"] is False
+    assert json.loads(chunks[-1])["message"] == "boom"
+
+
+class _FakeStorage:
+    """Хранилище-заглушка, запоминающее, закрыто ли оно"""
+
+    def __init__(self, opts):
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.closed = True
+
+
+class _FakeConnector:
+    def opts(self):
+        return self
+
+    def parse_params(self, conf_params, args):
+        return None
+
+    def storage(self):
+        return _FakeStorage
+
+
+class _FakeDevice:
+    def __init__(self, device_id):
+        self.id = device_id
+
+
+class _FakeLoader:
+    def __init__(self, storage, args):
+        self.storage = storage
+        self.devices = [] if args.query == ["empty"] else [_FakeDevice(args.query[0])]
+
+
+class _FakeCachedLoader(_FakeLoader):
+    def __init__(self, storage, args, devices):
+        self.storage = storage
+        self.devices = devices
+
+
+@pytest.fixture
+def device_cache(rest_api, monkeypatch):
+    """Пустой кеш устройств с хранилищем и Loader'ами-заглушками"""
+    from collections import OrderedDict
+    import multiprocessing
+
+    monkeypatch.setattr(rest_api, "_get_storage", lambda: (_FakeConnector(), {}))
+    monkeypatch.setattr(rest_api, "Loader", _FakeLoader)
+    monkeypatch.setattr(rest_api, "_CachedLoader", _FakeCachedLoader)
+    monkeypatch.setattr(rest_api, "_device_cache", OrderedDict())
+    monkeypatch.setattr(rest_api, "_device_generation", multiprocessing.Value("Q", 0))
+    monkeypatch.setattr(rest_api, "_device_cache_generation", 0)
+
+    def get_loader(query, **overrides):
+        args = rest_api.replace(rest_api._ARGS_TEMPLATE, query=query, **overrides)
+        with rest_api._open_loader(rest_api.DeviceQuery(query=query), args) as loader:
+            return loader
+
+    return rest_api, get_loader
+
+
+def test_device_cache_key(device_cache):
+    """Тест ключа кеша устройств: запрос и опции, влияющие на состав устройств"""
+    rest_api, get_loader = device_cache
+
+    loader = get_loader(["r1"])
+    # хранилище закрывается после запроса
+    assert loader.storage.closed
+    cached = get_loader(["r1"])
+    # Loader и генераторы создаются заново, устройства берутся из кеша
+    assert isinstance(cached, _FakeCachedLoader)
+    assert cached is not loader
+    assert cached.devices is loader.devices
+    assert cached.storage.closed
+    # опции генераторов не влияют на состав устройств
+    assert get_loader(["r1"], annotate=True, allowed_gens=["Gen"]).devices is loader.devices
+    assert get_loader(["r2"]).devices is not loader.devices
+    assert get_loader(["r1"], no_mesh=True).devices is not loader.devices
+    assert len(rest_api._device_cache) == 3
+
+
+def test_device_cache_empty_result(device_cache):
+    """Тест: пустой результат не кешируется"""
+    rest_api, get_loader = device_cache
+
+    get_loader(["empty"])
+    assert not rest_api._device_cache
+
+
+def test_device_cache_ttl(device_cache, monkeypatch):
+    """Тест истечения TTL кеша устройств"""
+    rest_api, get_loader = device_cache
+
+    monkeypatch.setattr(rest_api, "_DEVICE_CACHE_TTL", 0.0)
+    loader = get_loader(["r1"])
+    assert get_loader(["r1"]).devices is not loader.devices
+
+
+def test_device_cache_size(device_cache, monkeypatch):
+    """Тест вытеснения самых старых записей кеша устройств"""
+    rest_api, get_loader = device_cache
+
+    monkeypatch.setattr(rest_api, "_DEVICE_CACHE_SIZE", 2)
+    loader = get_loader(["r1"])
+    get_loader(["r2"])
+    get_loader(["r3"])
+    assert len(rest_api._device_cache) == 2
+    assert get_loader(["r1"]).devices is not loader.devices
+
+
+def test_device_cache_invalidation(device_cache):
+    """Тест сброса кеша устройств в этом и в других процессах"""
+    rest_api, get_loader = device_cache
+
+    get_loader(["r1"])
+    rest_api._invalidate_devices()
+    assert not rest_api._device_cache
+    assert rest_api._device_generation.value == 1
+
+    loader = get_loader(["r1"])
+    # сброс в другом процессе: увеличено только общее поколение
+    with rest_api._device_generation.get_lock():
+        rest_api._device_generation.value += 1
+    assert get_loader(["r1"]).devices is not loader.devices
+
+
+_INVENTORY = """
+devices:
+  - hostname: r1
+    fqdn: r1.lab
+    vendor: huawei
+    interfaces:
+      - name: eth0
+        description: uplink
+  - hostname: r2
+    fqdn: r2.lab
+    vendor: cisco
+    interfaces:
+      - name: eth0
+        description: uplink
+"""
+
+_CONTEXT = """
+generators:
+  default:
+    - annet_generators.example
+context:
+  default:
+    generators: default
+selected_context: default
+"""
+
+
+@pytest.fixture
+def file_storage_client(rest_api, tmp_path, monkeypatch):
+    """TestClient приложения с файловым хранилищем из двух устройств и генераторами из annet_generators.example"""
+    from collections import OrderedDict
+    from fastapi.testclient import TestClient
+    from annet.adapters.file.provider import Provider
+    from annet.hardware import AnnetHardwareProvider, hardware_connector
+    from annet.lib import get_context
+    from annet.rulebook import DefaultRulebookProvider, rulebook_provider_connector
+
+    inventory = tmp_path / "inventory.yml"
+    inventory.write_text(_INVENTORY)
+    context = tmp_path / "context.yml"
+    context.write_text(_CONTEXT)
+    monkeypatch.setenv("ANN_CONTEXT_CONFIG_PATH", str(context))
+    monkeypatch.setattr(hardware_connector, "_classes", [AnnetHardwareProvider])
+    monkeypatch.setattr(rulebook_provider_connector, "_classes", [DefaultRulebookProvider])
+    monkeypatch.setattr(rest_api, "_get_storage", lambda: (Provider(), {"path": str(inventory)}))
+    monkeypatch.setattr(rest_api, "_device_cache", OrderedDict())
+    get_context.cache_clear()
+    try:
+        with TestClient(rest_api.app) as client:
+            yield client
+    finally:
+        get_context.cache_clear()
+
+
+_COMMAND_BODY = {"query": {"query": ["r1.lab", "r2.lab"]}, "options": {"config": "empty"}}
+
+
+@pytest.mark.parametrize("command", ["gen", "patch"])
+def test_stream_command(file_storage_client, command):
+    """Тест потокового ответа: заголовок без data, затем по строке на каждый результат"""
+    with file_storage_client.stream("POST", f"/api/v1/{command}?stream=true", json=_COMMAND_BODY) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        lines = [json.loads(line) for line in response.iter_lines() if line]
+
+    assert lines[0]["success"] is True
+    assert "data" not in lines[0]
+    assert {row["device"] for row in lines[1:]} == {"r1", "r2"}
+    assert all(row["success"] for row in lines[1:])
+    # тот же результат, что и в обычном ответе
+    response = file_storage_client.post(f"/api/v1/{command}", json=_COMMAND_BODY)
+    assert sorted(lines[1:], key=lambda row: row["device"]) == sorted(response.json()["data"], key=lambda row: row["device"])
+
+
+def test_stream_command_not_found(file_storage_client):
+    """Тест: ошибка до первой строки потокового ответа отдается HTTP-статусом"""
+    body = {"query": {"query": ["unknown.lab"]}, "options": {"config": "empty"}}
+    response = file_storage_client.post("/api/v1/gen?stream=true", json=body)
+    assert response.status_code == 404
+
+
+def test_deploy_job_lifecycle(file_storage_client):
+    """Тест задачи deploy: запуск, статус до завершения, отмена завершенной и неизвестной задачи"""
+    response = file_storage_client.post("/api/v1/deploy", json=_COMMAND_BODY)
+    assert response.status_code == 200
+    job_id = response.json()["data"]["job_id"]
+
+    deadline = time.monotonic() + 30
+    while True:
+        response = file_storage_client.get(f"/api/v1/deploy/{job_id}")
+        assert response.status_code == 200
+        job = response.json()["data"]
+        if job["status"] != "running" or time.monotonic() > deadline:
+            break
+        time.sleep(0.05)
+    assert job["job_id"] == job_id
+    assert job["status"] in ("done", "failed")
+    if job["status"] == "failed":
+        assert job["error"]
+    else:
+        assert job["result"] is not None
+
+    assert file_storage_client.delete(f"/api/v1/deploy/{job_id}").status_code == 409
+    assert file_storage_client.get("/api/v1/deploy/unknown").status_code == 404
+    assert file_storage_client.delete("/api/v1/deploy/unknown").status_code == 404
+
+
+def test_devices_columnar(file_storage_client):
+    """Тест списка устройств в формате столбцов"""
+    params = {"query": ["r1.lab", "r2.lab"]}
+    rows = file_storage_client.get("/api/v1/devices", params=params).json()["data"]
+    response = file_storage_client.get("/api/v1/devices", params={**params, "format": "columnar"})
+    assert response.status_code == 200
+    columns = response.json()["data"]
+    assert columns["hostname"] == ["r1", "r2"]
+    assert columns["vendor"] == ["huawei", "cisco"]
+    assert [dict(zip(columns, values)) for values in zip(*columns.values())] == rows
+    assert file_storage_client.get("/api/v1/devices", params={**params, "format": "bad"}).status_code == 422
+
+
+def test_restart_broken_pool(rest_api, monkeypatch):
+    """Тест пересоздания пула после падения процесса"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    broken, fresh = ThreadPoolExecutor(1), ThreadPoolExecutor(1)
+    monkeypatch.setattr(rest_api, "_pool", broken)
+    monkeypatch.setattr(rest_api, "_pool_factory", lambda: fresh)
+
+    rest_api._restart_pool(broken)
+    assert rest_api._pool is fresh
+    # повторный сигнал от другого запроса к уже замененному пулу игнорируется
+    rest_api._restart_pool(broken)
+    assert rest_api._pool is fresh
+    fresh.shutdown()
+
+
+@pytest.fixture
+def api_client_module():
+    """Модуль клиентского скрипта examples/api_client.py"""
+    pytest.importorskip("requests")
+    import importlib.util
+
+    script_path = os.path.join(os.path.dirname(__file__), "..", "examples", "api_client.py")
+    spec = importlib.util.spec_from_file_location("api_client", script_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def counting_client(api_client_module, monkeypatch):
+    """Клиент, который вместо HTTP запросов считает их"""
+    def make(cache_ttl):
+        client = api_client_module.AnnetApiClient("http://api.test", cache_ttl=cache_ttl)
+        client.requests = []
+
+        def make_request(method, endpoint, **kwargs):
+            client.requests.append((method, endpoint, kwargs.get("params")))
+            return {"request": len(client.requests)}
+
+        monkeypatch.setattr(client, "_make_request", make_request)
+        return client
+    return make
+
+
+def test_api_client_cache(api_client_module, counting_client, monkeypatch):
+    """Тест кеша GET запросов клиента: попадание, ключ по параметрам и истечение TTL"""
+    now = [1000.0]
+    monkeypatch.setattr(api_client_module.time, "monotonic", lambda: now[0])
+    client = counting_client(cache_ttl=60)
+
+    assert client.health_check() == {"request": 1}
+    assert client.health_check() == {"request": 1}
+    assert client.get_devices(["r1"]) == {"request": 2}
+    assert client.get_devices(["r2"]) == {"request": 3}
+    assert client.get_devices(["r1"]) == {"request": 2}
+
+    now[0] += 61
+    assert client.health_check() == {"request": 4}
+    client.clear_cache()
+    assert client.health_check() == {"request": 5}
+
+
+def test_api_client_cache_disabled(counting_client):
+    """Тест: cache_ttl=0 отключает кеш"""
+    client = counting_client(cache_ttl=0)
+
+    client.health_check()
+    client.health_check()
+    assert len(client.requests) == 2
+
+
+def test_api_client_wait_deploy(api_client_module, monkeypatch):
+    """Тест ожидания фонового деплоя: статус опрашивается, пока задача выполняется"""
+    client = api_client_module.AnnetApiClient("http://api.test")
+    statuses = iter(["running", "running", "done"])
+    requests_sent = []
+
+    def make_request(method, endpoint, **kwargs):
+        requests_sent.append((method, endpoint))
+        return {"success": True, "data": {"job_id": "42", "status": next(statuses)}}
+
+    monkeypatch.setattr(client, "_make_request", make_request)
+    monkeypatch.setattr(api_client_module.time, "sleep", lambda interval: None)
+    assert client.wait_deploy("42")["data"]["status"] == "done"
+    assert requests_sent == [("GET", "/api/v1/deploy/42")] * 3
+
+
+class _FakeStreamResponse:
+    """Потоковый ответ requests с заданными строками"""
+
+    def __init__(self, lines):
+        self._lines = lines
+        self.closed = False
+
+    def iter_lines(self):
+        return iter(self._lines)
+
+    def close(self):
+        self.closed = True
+
+
+def test_api_client_stream(api_client_module, monkeypatch):
+    """Тест разбора потокового ответа NDJSON клиентом"""
+    client = api_client_module.AnnetApiClient("http://api.test")
+    response = _FakeStreamResponse([
+        b'{"success": true, "message": "Generating"}',
+        b'{"device": "r1"}',
+        b"",
+        b'{"device": "r2"}',
+    ])
+    monkeypatch.setattr(client, "_send", lambda *args, **kwargs: response)
+
+    result = client.generate_config(["r1", "r2"], stream=True)
+    assert result["success"] is True and result["message"] == "Generating"
+    assert not response.closed
+    assert list(result["data"]) == [{"device": "r1"}, {"device": "r2"}]
+    assert response.closed
+
+    # соединение закрывается и при досрочном прекращении итерации
+    response = _FakeStreamResponse([b'{"success": true}', b'{"device": "r1"}', b'{"device": "r2"}'])
+    data = client.generate_config(["r1", "r2"], stream=True)["data"]
+    assert next(data) == {"device": "r1"}
+    data.close()
+    assert response.closed
+
+
+def test_api_client_stream_empty(api_client_module, monkeypatch):
+    """Тест: пустой потоковый ответ - понятная ошибка, соединение закрывается"""
+    client = api_client_module.AnnetApiClient("http://api.test")
+    response = _FakeStreamResponse([b""])
+    monkeypatch.setattr(client, "_send", lambda *args, **kwargs: response)
+
+    with pytest.raises(ValueError, match="/api/v1/gen"):
+        client.generate_config(["r1"], stream=True)
+    assert response.closed
+
+
+def test_print_response(api_client_module, capsys):
+    """Тест вывода ответа: без данных, со списком и с потоковыми данными"""
+    api_client_module.print_response({"success": True, "message": "ok"}, "Health")
+    assert capsys.readouterr().out == "\n=== Health ===\nУспех: True\nСообщение: ok\n"
+
+    api_client_module.print_response({"success": True, "message": "ok", "data": [{"a": 1}, 2]})
+    listed = capsys.readouterr().out
+    assert "Данные:\n  [1] {" in listed and "  [2] 2\n" in listed
+
+    api_client_module.print_response({"success": True, "message": "ok", "data": iter([{"a": 1}, 2])})
+    assert capsys.readouterr().out == listed
+
+    # пустой поток выводится как ответ без данных
+    api_client_module.print_response({"success": True, "message": "ok", "data": iter([])}, "Health")
+    assert capsys.readouterr().out == "\n=== Health ===\nУспех: True\nСообщение: ok\n"
 
 
 def test_api_client_script():